@@ -7,7 +7,7 @@ import hashlib
 import copy
 from enum import Enum
 from dataclasses import dataclass
-from typing import Union, List, Set, Any
+from typing import Callable, Union, List, Set, Any
 
 __systemIsIntitialized_ = False
 
@@ -45,6 +45,12 @@ class UniqueLockMethod(Enum):
 	SameSet = 2  # Same Set of entries (including duplicates), any order
 	SameList = 3  # Same Set of entries (including duplicates), in this specific order
 
+class IndexMode(Enum):
+	Unindexed = 0  # Never indexed
+	Indexed = 1  # Indexed, unless the parent entity is stored unindexed
+	LengthChecked = 2  # Like Indexed, but excluded if it holds a string too long to be indexed
+	Forced = 3  # Always indexed, even inside an unindexed parent
+
 @dataclass
 class UniqueValue:  # Mark a bone as unique (it must have a different value for each entry)
 	method: UniqueLockMethod  # How to handle multiple values (for bones with multiple=True)
@@ -61,6 +67,7 @@ class baseBone(object):  # One Bone:
 	hasDBField = True
 	type = "hidden"
 	isClonedInstance = False
+	indexLengthCheck = True  # Set to False if this bone never stores strings that could exceed the index limits
 
 	def __init__(self, descr="", defaultValue=None, required=False, params=None, multiple=False, indexed=True,
 				 languages = None, searchable=False, vfunc=None, readOnly=False, visible=True, unique=False,
@@ -130,6 +137,30 @@ class baseBone(object):  # One Bone:
 		"""
 		pass
 
+	def getProjectionProperties(self, name: str) -> Union[None, List[str]]:
+		"""
+			Returns the datastore properties this bone reads its value from, so it can be populated by
+			a projection query.
+
+			:param name: The name of this bone in its skeleton
+			:returns: The list of property names or None if this bone can't be loaded from a projection (it's \
+				not indexed, holds multiple values or stores embedded entities).
+		"""
+		if not self.hasDBField or not self.indexed or self.multiple or self.languages:
+			return None
+		return [name]
+
+	def getIndexMode(self) -> IndexMode:
+		"""
+			Returns how the property written by this bone has to be indexed.
+			Evaluated once per skeleton class when its index schema is compiled (see
+			:class:`viur.core.skeleton.MetaBaseSkel`), so this must only depend on
+			the bone's configuration, not on its current value.
+		"""
+		if not self.indexed:
+			return IndexMode.Unindexed
+		return IndexMode.LengthChecked if self.indexLengthCheck else IndexMode.Indexed
+
 	def isInvalid(self, value):
 		"""
 			Returns None if the value would be valid for
@@ -406,12 +437,6 @@ class baseBone(object):  # One Bone:
 			else:  # No Languages, not Multiple
 				res = self.singleValueSerialize(newVal, skel, name, parentIndexed)
 			skel.dbEntity[name] = res
-			# Ensure our indexed flag is up2date
-			indexed = self.indexed and parentIndexed
-			if indexed and name in skel.dbEntity.exclude_from_indexes:
-				skel.dbEntity.exclude_from_indexes.discard(name)
-			elif not indexed and name not in skel.dbEntity.exclude_from_indexes:
-				skel.dbEntity.exclude_from_indexes.add(name)
 			return True
 		return False
 
@@ -503,6 +528,135 @@ class baseBone(object):  # One Bone:
 		skel.accessedValues[name] = self.getDefaultValue(skel)
 		return False
 
+	def compileSerializer(self, name: str) -> Callable[['viur.core.skeleton.SkeletonInstance', bool], bool]:
+		"""
+			Returns a function equivalent to calling serialize(skel, name, parentIndexed), but with the checks for
+			languages and multiple already resolved. Called once per skeleton class when it's codec is compiled.
+			Bones overriding serialize get a plain wrapper around their implementation.
+
+			:param name: The property-name this bone has in its Skeleton (not the description!)
+			:returns: A callable taking the skeleton instance and the parentIndexed flag
+		"""
+		if type(self).serialize is not baseBone.serialize:
+			serialize = self.serialize
+			return lambda skel, parentIndexed: serialize(skel, name, parentIndexed)
+		languages = self.languages
+		isPassThrough = type(self).singleValueSerialize is baseBone.singleValueSerialize
+		singleValueSerialize = self.singleValueSerialize
+		if languages and self.multiple:
+			def serializeValue(newVal, skel, parentIndexed):
+				res = {"_viurLanguageWrapper_": True}
+				for language in languages:
+					if language not in newVal:
+						res[language] = []
+					elif isPassThrough:
+						res[language] = list(newVal[language])
+					else:
+						res[language] = [singleValueSerialize(x, skel, name, parentIndexed) for x in newVal[language]]
+				return res
+		elif languages:
+			def serializeValue(newVal, skel, parentIndexed):
+				res = {"_viurLanguageWrapper_": True}
+				for language in languages:
+					if language not in newVal:
+						res[language] = []
+					else:
+						res[language] = singleValueSerialize(newVal[language], skel, name, parentIndexed)
+				return res
+		elif self.multiple:
+			if isPassThrough:
+				serializeValue = lambda newVal, skel, parentIndexed: list(newVal)
+			else:
+				serializeValue = lambda newVal, skel, parentIndexed: \
+					[singleValueSerialize(x, skel, name, parentIndexed) for x in newVal]
+		elif isPassThrough:
+			serializeValue = lambda newVal, skel, parentIndexed: newVal
+		else:
+			serializeValue = lambda newVal, skel, parentIndexed: singleValueSerialize(newVal, skel, name, parentIndexed)
+
+		def serializer(skel, parentIndexed):
+			if name not in skel.accessedValues:
+				return False
+			newVal = skel.accessedValues[name]
+			skel.dbEntity[name] = serializeValue(newVal, skel, parentIndexed) if newVal else None
+			return True
+
+		return serializer
+
+	def compileUnserializer(self, name: str) -> Callable[['viur.core.skeleton.SkeletonInstance'], bool]:
+		"""
+			Returns a function equivalent to calling unserialize(skel, name), but with the checks for languages
+			and multiple already resolved. Values that have been written with a different languages or multiple
+			setting are handed over to unserialize, which knows how to convert them.
+
+			:param name: The property-name this bone has in its Skeleton (not the description!)
+			:returns: A callable taking the skeleton instance
+		"""
+		unserialize = self.unserialize
+		if type(self).unserialize is not baseBone.unserialize:
+			return lambda skel: unserialize(skel, name)
+		isPassThrough = type(self).singleValueUnserialize is baseBone.singleValueUnserialize
+		singleValueUnserialize = self.singleValueUnserialize
+		languages = self.languages
+		if languages and self.multiple:
+			def unserializeValue(loadVal, skel):
+				res = {}
+				for language in languages:
+					res[language] = []
+					if language in loadVal:
+						tmpVal = loadVal[language]
+						if not isinstance(tmpVal, list):
+							tmpVal = [tmpVal]
+						res[language] = [singleValueUnserialize(x, skel, name) for x in tmpVal]
+				return res
+			expectedType = dict
+		elif languages:
+			def unserializeValue(loadVal, skel):
+				res = {}
+				for language in languages:
+					res[language] = None
+					if language in loadVal:
+						tmpVal = loadVal[language]
+						if isinstance(tmpVal, list) and tmpVal:
+							tmpVal = tmpVal[0]
+						res[language] = singleValueUnserialize(tmpVal, skel, name)
+				return res
+			expectedType = dict
+		elif self.multiple:
+			def unserializeValue(loadVal, skel):
+				if not loadVal:
+					return []
+				if isPassThrough:
+					return list(loadVal)
+				return [singleValueUnserialize(x, skel, name) for x in loadVal]
+			expectedType = list
+		else:
+			def unserializeValue(loadVal, skel):
+				if not loadVal:
+					return None
+				return loadVal if isPassThrough else singleValueUnserialize(loadVal, skel, name)
+			expectedType = None
+
+		def unserializer(skel):
+			dbEntity = skel.dbEntity
+			if name not in dbEntity:
+				skel.accessedValues[name] = self.getDefaultValue(skel)
+				return False
+			loadVal = dbEntity[name]
+			isTranslated = isinstance(loadVal, dict) and "_viurLanguageWrapper_" in loadVal
+			if expectedType is dict:
+				matchesLayout = isTranslated
+			elif expectedType is list:
+				matchesLayout = not isTranslated and (not loadVal or isinstance(loadVal, list))
+			else:
+				matchesLayout = not isTranslated and not isinstance(loadVal, list)
+			if not matchesLayout:
+				return unserialize(skel, name)  # Stored with a different configuration, let unserialize convert it
+			skel.accessedValues[name] = unserializeValue(loadVal, skel)
+			return True
+
+		return unserializer
+
 	def delete(self, skel: 'viur.core.skeleton.SkeletonInstance', name: str):
 		"""
 			Like postDeletedHandler, but runs inside the transaction
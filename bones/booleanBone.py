@@ -7,6 +7,7 @@ from typing import List, Union, Any
 
 class booleanBone(baseBone):
 	type = "bool"
+	indexLengthCheck = False
 	trueStrs = [str(True), u"1", u"yes"]
 
 	@staticmethod
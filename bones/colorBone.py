@@ -7,6 +7,7 @@ from typing import List, Union
 
 class colorBone(baseBone):
 	type = "color"
+	indexLengthCheck = False
 
 	def __init__(self, mode="rgb", *args, **kwargs):  # mode rgb/rgba
 		baseBone.__init__(self, *args, **kwargs)
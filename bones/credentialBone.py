@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from viur.core.bones import stringBone
+from viur.core.bones.bone import IndexMode
+from typing import List
 
 
 class credentialBone(stringBone):
@@ -16,11 +18,16 @@ class credentialBone(stringBone):
 		if self.multiple or self.languages:
 			raise ValueError("Credential-Bones cannot be multiple or translated!")
 
+	def getIndexMode(self) -> IndexMode:
+		"""
+			Credentials are never indexed.
+		"""
+		return IndexMode.Unindexed
+
 	def serialize(self, skel: 'SkeletonInstance', name: str, parentIndexed: bool) -> bool:
 		"""
 			Update the value only if a new value is supplied.
 		"""
-		skel.dbEntity.exclude_from_indexes.add(name)  # Ensure we are never indexed
 		if name in skel.accessedValues and skel.accessedValues[name]:
 			skel.dbEntity[name] = skel.accessedValues[name]
 			return True
@@ -31,3 +38,9 @@ class credentialBone(stringBone):
 			We'll never read our value from the database.
 		"""
 		return {}
+
+	def getProjectionProperties(self, name: str) -> List[str]:
+		"""
+			We'll never read our value from the database, so there's nothing to project.
+		"""
+		return []
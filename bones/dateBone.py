@@ -26,6 +26,7 @@ def datetimeToTimestamp(datetimeObj: datetime) -> int:
 
 class dateBone(baseBone):
 	type = "date"
+	indexLengthCheck = False
 
 	@staticmethod
 	def generageSearchWidget(target, name="DATE BONE", mode="range"):
@@ -1,16 +1,32 @@
 # -*- coding: utf-8 -*-
-from viur.core.bones.bone import baseBone
+from viur.core.bones.bone import baseBone, IndexMode
 from viur.core.db import Entity, KeyClass, keyHelper, KEY_SPECIAL_PROPERTY
 from viur.core.utils import normalizeKey
 import logging
+from typing import List, Union
 
 class keyBone(baseBone):
 	type = "key"
+	indexLengthCheck = False
 
 	def __init__(self, descr="Key", readOnly=True, visible=False, **kwargs):
 		super(keyBone, self).__init__(descr=descr, readOnly=True, visible=visible, defaultValue=None, **kwargs)
 
 
+	def getProjectionProperties(self, name: str) -> Union[None, List[str]]:
+		"""
+			The key of an entity is always part of a projection.
+		"""
+		if name == "key":
+			return []
+		return super(keyBone, self).getProjectionProperties(name)
+
+	def getIndexMode(self) -> IndexMode:
+		"""
+			Keys can never be not indexed.
+		"""
+		return IndexMode.Forced
+
 	def unserialize(self, skel: 'viur.core.skeleton.SkeletonValues', name: str) -> bool:
 		"""
 			Inverse of serialize. Evaluates whats
@@ -65,7 +81,6 @@ class keyBone(baseBone):
 				skel.dbEntity.key = skel.accessedValues["key"]
 			else:
 				skel.dbEntity[name] = skel.accessedValues[name]
-				skel.dbEntity.exclude_from_indexes.discard(name)  # Keys can never be not indexed
 			return True
 		return False
 
@@ -19,6 +19,7 @@ class numericBone(baseBone):
 		return ({"name": name, "mode": mode, "target": target, "type": "numeric"})
 
 	type = "numeric"
+	indexLengthCheck = False
 
 	def __init__(self, precision=0, min=-int(pow(2, 30)), max=int(pow(2, 30)), defaultValue=None, *args, **kwargs):
 		"""
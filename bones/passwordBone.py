@@ -105,14 +105,14 @@ class passwordBone(stringBone):
 			salt = utils.generateRandomString(self.saltLength)
 			passwd = pbkdf2(skel.accessedValues[name][: conf["viur.maxPasswordLength"]], salt)
 			skel.dbEntity[name] = {"pwhash": passwd, "salt": salt}
-			# Ensure our indexed flag is up2date
-			indexed = self.indexed and parentIndexed
-			if indexed and name in skel.dbEntity.exclude_from_indexes:
-				skel.dbEntity.exclude_from_indexes.discard(name)
-			elif not indexed and name not in skel.dbEntity.exclude_from_indexes:
-				skel.dbEntity.exclude_from_indexes.add(name)
 			return True
 		return False
 
 	def unserialize(self, skeletonValues, name):
 		return False
+
+	def getProjectionProperties(self, name: str) -> List[str]:
+		"""
+			We'll never read our value from the database, so there's nothing to project.
+		"""
+		return []
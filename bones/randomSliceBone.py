@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from viur.core.bones import baseBone
+from viur.core.bones.bone import IndexMode
 from viur.core import db
 from random import random, sample, shuffle
 from itertools import chain
@@ -12,6 +13,7 @@ class randomSliceBone(baseBone):
 	"""
 
 	type = "randomslice"
+	indexLengthCheck = False
 
 	def __init__(self, visible=False, readOnly=True, slices=2, sliceSize=0.5, *args, **kwargs):
 		"""
@@ -38,9 +40,14 @@ class randomSliceBone(baseBone):
 			:returns: dict
 		"""
 		skel.dbEntity[name] = random
-		skel.dbEntity.exclude_from_indexes.discard(name)  # Random bones can never be not indexed
 		return True
 
+	def getIndexMode(self) -> IndexMode:
+		"""
+			Random bones can never be not indexed.
+		"""
+		return IndexMode.Forced
+
 	def buildDBSort(self, name, skel, dbFilter, rawFilter):
 		"""
 			Same as buildDBFilter, but this time its not about filtering
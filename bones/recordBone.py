@@ -7,6 +7,7 @@ import copy
 
 class recordBone(baseBone):
 	type = "record"
+	indexLengthCheck = False  # Our values are embedded entities that are never indexed
 
 	def __init__(self, using, format=None, multiple=True, indexed=False, *args, **kwargs):
 		super(recordBone, self).__init__(multiple=multiple, *args, **kwargs)
@@ -20,6 +21,12 @@ class recordBone(baseBone):
 
 	# self._usingSkelCache = self.using()
 
+	def getProjectionProperties(self, name: str) -> None:
+		"""
+			Records are stored as embedded entities, which can't be loaded from a projection.
+		"""
+		return None
+
 	def singleValueUnserialize(self, val, skel: 'viur.core.skeleton.SkeletonInstance', name: str):
 		assert isinstance(val, dict), "Read something from the datastore thats not a dict: %s" % str(type(val))
 		usingSkel = self.using()
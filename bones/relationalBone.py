@@ -4,7 +4,7 @@ from viur.core.bones.bone import getSystemInitialized
 from viur.core.bones.stringBone import LanguageWrapper
 from viur.core import db
 from viur.core.errors import ReadFromClientError
-from typing import List, Union
+from typing import Dict, List, Union
 
 try:
 	import extjson
@@ -18,6 +18,7 @@ from viur.core.bones.bone import ReadFromClientError, ReadFromClientErrorSeverit
 from typing import List
 from enum import Enum
 from itertools import chain
+from contextvars import ContextVar
 
 
 class RelationalConsistency(Enum):
@@ -27,6 +28,23 @@ class RelationalConsistency(Enum):
 	CascadeDeletion = 4  # Delete this object also if the referenced entry is deleted (Dangerous!)
 
 
+# Entries referenced by the values currently read in relationalBone.fromClient, fetched with one call
+_prefetchedEntries = ContextVar("Prefetched relational entries", default=None)
+
+
+def _sameRelationValue(oldVal, newVal) -> bool:
+	"""
+		Compares a property read from an existing viur-relations entry with the one we would write.
+		Entities are compared by key and content only, as their index settings aren't always read back.
+	"""
+	if isinstance(oldVal, db.Entity) and isinstance(newVal, db.Entity):
+		return oldVal.key == newVal.key and oldVal.keys() == newVal.keys() \
+			   and all([_sameRelationValue(oldVal[k], newVal[k]) for k in newVal.keys()])
+	elif isinstance(oldVal, (list, tuple)) and isinstance(newVal, (list, tuple)):
+		return len(oldVal) == len(newVal) and all([_sameRelationValue(a, b) for a, b in zip(oldVal, newVal)])
+	return oldVal == newVal
+
+
 class relationalBone(baseBone):
 	"""
 		This is our magic class implementing relations.
@@ -58,6 +76,7 @@ class relationalBone(baseBone):
 	refKeys = ["key", "name"]
 	parentKeys = ["key", "name"]
 	type = "relational"
+	indexLengthCheck = False  # Referenced skeletons exclude their own long values (see BaseSkeleton.serialize)
 	kind = None
 
 	def __init__(self, kind=None, module=None, refKeys=None, parentKeys=None, multiple=False, format="$(dest.name)",
@@ -171,6 +190,12 @@ class relationalBone(baseBone):
 		return {"dest": relSkel, "rel": usingData}
 
 
+	def getProjectionProperties(self, name: str) -> None:
+		"""
+			Relations are stored as embedded entities, which can't be loaded from a projection.
+		"""
+		return None
+
 	def serialize(self, skel: 'SkeletonInstance', name: str, parentIndexed: bool) -> bool:
 		oldRelationalLocks = set(skel.dbEntity.get("%s_outgoingRelationalLocks" % name) or [])
 		newRelationalLocks = set()
@@ -245,11 +270,6 @@ class relationalBone(baseBone):
 				usingData = None
 			res = {"rel": usingData, "dest": refData}
 		skel.dbEntity[name] = res
-		# Ensure our indexed flag is up2date
-		if indexed and name in skel.dbEntity.exclude_from_indexes:
-			skel.dbEntity.exclude_from_indexes.discard(name)
-		elif not indexed and name not in skel.dbEntity.exclude_from_indexes:
-			skel.dbEntity.exclude_from_indexes.add(name)
 		# Ensure outgoing Locks are up2date
 		if self.consistency != RelationalConsistency.PreventDeletion:
 			# We don't need to lock anything, but may delete old locks held
@@ -315,51 +335,63 @@ class relationalBone(baseBone):
 		parentValues.key = srcEntity.key
 		for boneKey in (self.parentKeys or []):
 			parentValues[boneKey] = srcEntity.get(boneKey)
+		# Group our values by the key they're referencing - the same entry might be referenced more than once
+		valuesByDestKey = {}
+		for val in values:
+			valuesByDestKey.setdefault(val["dest"]["key"], []).append(val)
 		dbVals = db.Query("viur-relations")
 		dbVals.filter("viur_src_kind =", skel.kindName)
 		dbVals.filter("viur_dest_kind =", self.kind)
 		dbVals.filter("viur_src_property =", boneName)
 		dbVals.filter("src.__key__ =", key)
-		for dbObj in dbVals.iter():
+		toPut = []
+		toDelete = []
+		for dbObj in dbVals.iter(batchSize=db.MAX_GET_MULTI_SIZE):  # Fetch the existing relations in large batches
 			try:
-				if not dbObj["dest"].key in [x["dest"]["key"] for x in values]:  # Relation has been removed
-					db.Delete(dbObj.key)
-					continue
+				destKey = dbObj["dest"].key
 			except:  # This entry is corrupt
-				db.Delete(dbObj.key)
-			else:  # Relation: Updated
-				data = [x for x in values if x["dest"]["key"] == dbObj["dest"].key][0]
-				# Write our (updated) values in
-				refSkel = data["dest"]
-				dbObj["dest"] = refSkel.serialize(parentIndexed=True)
-				dbObj["src"] = parentValues
-				if self.using is not None:
-					usingSkel = data["rel"]
-					dbObj["rel"] = usingSkel.serialize(parentIndexed=True)
-				dbObj["viur_delayed_update_tag"] = time()
-				dbObj["viur_relational_updateLevel"] = self.updateLevel
-				dbObj["viur_relational_consistency"] = self.consistency.value
-				dbObj["viur_foreign_keys"] = self.refKeys
-				dbObj["viurTags"] = srcEntity.get("viurTags")  # Copy tags over so we can still use our searchengine
-				db.Put(dbObj)
-				values.remove(data)
+				toDelete.append(dbObj.key)
+				continue
+			if not valuesByDestKey.get(destKey):  # Relation has been removed
+				toDelete.append(dbObj.key)
+				continue
+			data = valuesByDestKey[destKey].pop(0)
+			relationValues = self._buildRelationValues(data, parentValues, srcEntity)
+			if all([_sameRelationValue(dbObj.get(k), v) for k, v in relationValues.items()]):
+				continue  # Nothing changed, don't rewrite that entry
+			dbObj.update(relationValues)
+			dbObj["viur_delayed_update_tag"] = time()
+			toPut.append(dbObj)
 		# Add any new Relation
-		for val in values:
+		for val in chain(*valuesByDestKey.values()):
 			dbObj = db.Entity(db.Key("viur-relations", parent=key))
-			refSkel = val["dest"]
-			dbObj["dest"] = refSkel.serialize(parentIndexed=True)
-			dbObj["src"] = parentValues
-			if self.using is not None:
-				usingSkel = val["rel"]
-				dbObj["rel"] = usingSkel.serialize(parentIndexed=True)
+			dbObj.update(self._buildRelationValues(val, parentValues, srcEntity))
 			dbObj["viur_delayed_update_tag"] = time()
 			dbObj["viur_src_kind"] = skel.kindName  # The kind of the entry referencing
 			dbObj["viur_src_property"] = boneName  # The key of the bone referencing
 			dbObj["viur_dest_kind"] = self.kind
-			dbObj["viur_relational_updateLevel"] = self.updateLevel
-			dbObj["viur_relational_consistency"] = self.consistency.value
-			dbObj["viur_foreign_keys"] = self.refKeys
-			db.Put(dbObj)
+			toPut.append(dbObj)
+		if toDelete:
+			db.Delete(toDelete)
+		if toPut:
+			db.Put(toPut)
+
+	def _buildRelationValues(self, val, parentValues: db.Entity, srcEntity: db.Entity) -> dict:
+		"""
+			Builds the properties of the viur-relations entry for the given value which depend on it's
+			current content (everything except the update tag and the properties it's queried by).
+		"""
+		res = {
+			"dest": val["dest"].serialize(parentIndexed=True),
+			"src": parentValues,
+			"viur_relational_updateLevel": self.updateLevel,
+			"viur_relational_consistency": self.consistency.value,
+			"viur_foreign_keys": self.refKeys,
+			"viurTags": srcEntity.get("viurTags"),  # Copy tags over so we can still use our searchengine
+		}
+		if self.using is not None:
+			res["rel"] = val["rel"].serialize(parentIndexed=True)
+		return res
 
 	def postDeletedHandler(self, skel, boneName, key):
 		dbVals = db.Query("viur-relations")  # skel.kindName+"_"+self.kind+"_"+key
@@ -375,8 +407,44 @@ class relationalBone(baseBone):
 	def parseSubfieldsFromClient(self):
 		return self.using is not None
 
+	def _collectSubmittedKeys(self, parsedData) -> List[str]:
+		"""
+			Returns all keys contained in the raw data collected by collectRawClientData.
+		"""
+		if isinstance(parsedData, str):
+			return [parsedData]
+		elif isinstance(parsedData, list):
+			return list(chain(*[self._collectSubmittedKeys(x) for x in parsedData]))
+		elif isinstance(parsedData, dict):
+			if self.using and "key" in parsedData:  # A single value including its using-data
+				return [parsedData["key"]] if isinstance(parsedData["key"], str) else []
+			return list(chain(*[self._collectSubmittedKeys(x) for x in parsedData.values()]))  # Translated
+		return []
+
+	def fromClient(self, skel: 'SkeletonInstance', name: str, data: dict) -> Union[None, List[ReadFromClientError]]:
+		"""
+			Fetches all entries referenced by the submitted values with one call, so that
+			singleValueFromClient doesn't have to fetch them one by one.
+		"""
+		parsedData, fieldSubmitted = self.collectRawClientData(name, data, self.multiple, self.languages,
+															   self.parseSubfieldsFromClient())
+		dbKeys = []
+		if fieldSubmitted:
+			for key in self._collectSubmittedKeys(parsedData):
+				try:
+					dbKeys.append(db.keyHelper(key, self.kind))
+				except:  # Invalid key; singleValueFromClient will report that value
+					continue
+		prefetched = dict(zip(dbKeys, db.GetMulti(dbKeys))) if dbKeys else {}
+		token = _prefetchedEntries.set(prefetched)
+		try:
+			return super().fromClient(skel, name, data)
+		finally:
+			_prefetchedEntries.reset(token)
+
 	def singleValueFromClient(self, value, skel, name, origData):
 		oldValues = skel[name]
+		prefetched = _prefetchedEntries.get() or {}
 		def restoreSkels(key, usingData, index=None):
 			refSkel, usingSkel = self._getSkels()
 			isEntryFromBackup = False  # If the referenced entry has been deleted, restore information from backup
@@ -385,7 +453,7 @@ class relationalBone(baseBone):
 			errors = []
 			try:
 				dbKey = db.keyHelper(key, self.kind)
-				entry = db.Get(dbKey)
+				entry = prefetched[dbKey] if dbKey in prefetched else db.Get(dbKey)
 				assert entry
 			except:  # Invalid key or something like that
 				logging.info("Invalid reference key >%s< detected on bone '%s'",
@@ -696,33 +764,95 @@ class relationalBone(baseBone):
 						res.append("src.%s" % orderKey)
 		return (res)
 
+	def _updateDestValues(self, relDict, newValues: db.Entity):
+		"""
+			Copies the values listed in refKeys from newValues (the referenced entity) into relDict["dest"].
+		"""
+		if relDict["dest"].dbEntity is None:  # Values read by fromClient are only kept unserialized
+			relDict["dest"].dbEntity = db.Entity()
+		for boneName in self.refKeys:
+			if boneName != "key" and boneName in newValues:
+				relDict["dest"].dbEntity[boneName] = newValues[boneName]
+				relDict["dest"].accessedValues.pop(boneName, None)  # Don't keep the outdated value
+
+	def _getRelDicts(self, value) -> List[dict]:
+		"""
+			Returns the individual references (dicts of dest and rel) contained in the given value of this bone.
+		"""
+		if not value:
+			return []
+		if isinstance(value, dict) and "dest" in value:
+			return [value]
+		elif isinstance(value, dict):  # Translated
+			return list(chain(*[x if isinstance(x, list) else [x] for x in value.values() if x]))
+		return value
+
+	def updateReferencedValues(self, skel, boneName, destEntity: db.Entity) -> int:
+		"""
+			Updates the values we've cached from *destEntity* in all of our references to it,
+			without fetching anything from the datastore.
+
+			:returns: The amount of references updated
+		"""
+		updated = 0
+		for relDict in self._getRelDicts(skel[boneName]):
+			if isinstance(relDict, dict) and relDict.get("dest") and relDict["dest"]["key"] == destEntity.key:
+				self._updateDestValues(relDict, destEntity)
+				updated += 1
+		return updated
+
+	def getReferencedKeys(self, skel, boneName, ignoreUpdateLevel: bool = False) -> List[db.KeyClass]:
+		"""
+			Returns the keys of all entries we're referencing that :meth:`refreshReferences` would update.
+			If ignoreUpdateLevel is set, all referenced keys are returned, regardless of our updateLevel.
+		"""
+		if self.updateLevel == 2 and not ignoreUpdateLevel:
+			return []
+		res = []
+		for relDict in self._getRelDicts(skel[boneName]):
+			if isinstance(relDict, dict) and relDict.get("dest"):
+				try:
+					res.append(db.keyHelper(relDict["dest"]["key"], self.kind))
+				except ValueError:
+					continue
+		return res
+
+	def refreshReferences(self, skel, boneName, entities: Dict[db.KeyClass, db.Entity]) -> List[db.KeyClass]:
+		"""
+			Refresh all values we might have cached from other entities, taking them from *entities*
+			(as fetched by the caller for the keys returned by :meth:`getReferencedKeys`).
+
+			:returns: The keys of all references pointing to entries that don't exist anymore
+		"""
+		if self.updateLevel == 2:
+			return []
+		dangling = []
+		for relDict in self._getRelDicts(skel[boneName]):
+			if not (isinstance(relDict, dict) and relDict.get("dest")):
+				logging.error("Invalid dictionary in refreshReferences: %s" % relDict)
+				continue
+			try:
+				dbKey = db.keyHelper(relDict["dest"]["key"], self.kind)
+			except ValueError:
+				logging.error("Invalid key in refreshReferences: %s" % relDict["dest"]["key"])
+				continue
+			newValues = entities.get(dbKey)
+			if newValues is None:
+				logging.info("The key %s does not exist" % dbKey)
+				dangling.append(dbKey)
+				continue
+			self._updateDestValues(relDict, newValues)
+		return dangling
+
 	def refresh(self, skel, boneName):
 		"""
 			Refresh all values we might have cached from other entities.
 		"""
-		def updateInplace(relDict):
-			"""
-				Fetches the entity referenced by valDict["dest.key"] and updates all dest.* keys
-				accordingly
-			"""
-			if not (isinstance(relDict, dict) and "dest" in relDict):
-				logging.error("Invalid dictionary in updateInplace: %s" % relDict)
-				return
-			newValues = db.Get(db.keyHelper(relDict["dest"]["key"], self.kind))
-			if newValues is None:
-				logging.info("The key %s does not exist" % relDict["dest"]["key"])
-				return
-			for boneName in self.refKeys:
-				if boneName != "key" and boneName in newValues:
-					relDict["dest"].dbEntity[boneName] = newValues[boneName]
 		if not skel[boneName] or self.updateLevel == 2:
 			return
 		logging.debug("Refreshing relationalBone %s of %s" % (boneName, skel.kindName))
-		if isinstance(skel[boneName], dict):
-			updateInplace(skel[boneName])
-		elif isinstance(skel[boneName], list):
-			for k in skel[boneName]:
-				updateInplace(k)
+		dbKeys = self.getReferencedKeys(skel, boneName)
+		self.refreshReferences(skel, boneName, dict(zip(dbKeys, db.GetMulti(dbKeys))))
 
 	def getSearchTags(self, skeltonValues, key):
 		def getValues(res, skel, valuesCache):
@@ -8,6 +8,7 @@ from typing import List, Union
 
 class selectBone(baseBone):
 	type = "select"
+	indexLengthCheck = False
 
 	def __init__(self, defaultValue=None, values={}, multiple=False, *args, **kwargs):
 		"""
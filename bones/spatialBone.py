@@ -45,6 +45,7 @@ class spatialBone(baseBone):
 	"""
 
 	type = "spatial"
+	indexLengthCheck = False
 
 	def __init__(self, boundsLat, boundsLng, gridDimensions, *args, **kwargs):
 		"""
@@ -100,6 +101,12 @@ class spatialBone(baseBone):
 			else:
 				return False
 
+	def getProjectionProperties(self, name: str) -> None:
+		"""
+			Coordinates are stored as embedded entities, which can't be loaded from a projection.
+		"""
+		return None
+
 	def singleValueSerialize(self, value, skel: 'SkeletonInstance', name: str, parentIndexed: bool):
 		if not value:
 			return None
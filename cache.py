@@ -202,16 +202,17 @@ def flushCache(prefix="/*"):
 			- "/*" everything from the cache, "/page/*" everything from the page-module (default render),
 			- and "/page/view/*" only that specific subset of the page-module.
 	"""
-	items = db.Query(viurCacheName).filter("path =", prefix.rstrip("*")).iter(keysOnly=True)
-	for item in items:
-		db.Delete(item)
+	items = db.Query(viurCacheName).filter("path =", prefix.rstrip("*")) \
+		.iter(keysOnly=True, batchSize=db.MAX_DELETE_MULTI_SIZE, pages=True)
+	for keys in items:
+		db.Delete(keys)
 	if prefix.endswith("*"):
 		items = db.Query(viurCacheName) \
 			.filter("path >", prefix.rstrip("*")) \
 			.filter("path <", prefix.rstrip("*") + u"\ufffd") \
-			.iter(keysOnly=True)
-		for item in items:
-			db.Delete(item)
+			.iter(keysOnly=True, batchSize=db.MAX_DELETE_MULTI_SIZE, pages=True)
+		for keys in items:
+			db.Delete(keys)
 	logging.debug("Flushing cache succeeded. Everything matching \"%s\" is gone." % prefix)
 
 
@@ -26,6 +26,45 @@ conf = {
 
 	# Cache strategy used by the database. 2: Aggressive, 1: Safe, 0: Off
 	"viur.db.caching": 2,
+	# Upper bounds for the process-wide entity cache (amount of entities and their estimated size)
+	"viur.db.cache.maxEntries": 10000,
+	"viur.db.cache.maxBytes": 32 * 1024 * 1024,
+	# Seconds an entity may be served from the process-wide entity cache
+	"viur.db.cache.defaultTTL": 60,
+	# Overrides the TTL for certain kinds (0 disables caching for that kind). In "safe" mode only these are cached
+	"viur.db.cache.kindTTL": {},
+	# Kinds never served from the process-wide entity cache
+	"viur.db.cache.excludedKinds": {"viur-session", "viur-securitykeys", "viur-transactionmarker",
+									"viur-task-interval", "viur-cache", "viur-seo-keys", "viur-relations-outbox",
+									"viur-sharded-scans", "viur-sharded-scan-shards"},
+	# Kinds ending with one of these suffixes are never served from the process-wide entity cache either
+	"viur.db.cache.excludedKindSuffixes": ("_uniquePropertyIndex",),
+	# Amount of threads used to send large db.Get/Put/Delete batches to the datastore concurrently
+	"viur.db.bulkThreads": 4,
+	# Amount of threads serving db.GetAsync, db.PutAsync, Query.runAsync and friends
+	"viur.db.asyncThreads": 8,
+	# If enabled, entities fetched by db.Get are remembered for the remainder of the current request
+	"viur.db.identityMap": True,
+	# Seconds the results of db.Query.run may be served from the query cache per kind. Kinds not listed aren't cached
+	"viur.db.queryCache.kindTTL": {},
+	# Upper bounds for the query cache (amount of cached results and their estimated size)
+	"viur.db.queryCache.maxEntries": 1000,
+	"viur.db.queryCache.maxBytes": 16 * 1024 * 1024,
+	# How often db.RunInTransaction retries a transaction that failed due to contention
+	"viur.db.transactionRetries": 3,
+	# Upper bounds (in seconds) for the randomized, exponentially growing delay between these retries
+	"viur.db.transactionRetryBaseDelay": 0.1,
+	"viur.db.transactionRetryMaxDelay": 2.0,
+	# If set, called after each transaction attempt with (kinds, attempt, duration, succeeded, willRetry)
+	"viur.db.transactionMetricsHook": None,
+	# Amount of keys involved in conflicts remembered by db.getTransactionStats
+	"viur.db.transactionStats.maxHotKeys": 100,
+	# If enabled, Puts and Deletes inside transactions are collected and sent along with the commit
+	"viur.db.bufferTransactionWrites": True,
+	# If enabled, the shape of each query run is recorded (see db.queryShapeRecorder)
+	"viur.db.recordQueryShapes": False,
+	# Upper bound for the amount of distinct query shapes recorded
+	"viur.db.recordQueryShapes.maxShapes": 1000,
 
 	# If enabled, user-generated exceptions from the server.errors module won't be caught and handled
 	"viur.debug.traceExceptions": False,
@@ -134,11 +173,28 @@ conf = {
 	# If set, these Fields will survive the session.reset() called on user/logout
 	"viur.session.persistentFieldsOnLogout": [],
 
+	# Amount of viur-relations entries processed by one updateRelations task
+	"viur.relations.refreshBatchSize": 100,
+	# Amount of referencing entries updated concurrently (each in its own transaction) by updateRelations
+	"viur.relations.refreshThreads": 4,
+	# Seconds an entry of the relations outbox is left to the task scheduled by toDB, before the periodic drainer picks it up
+	"viur.relations.outboxGracePeriod": 5 * 60,
+
+	# Deprecated: If set, SEO-keys missing in the SEO-key registry are also looked up by querying viurActiveSeoKeys.
+	# Only needed for entries saved before the registry existed until the backfillSeoKeyRegistry task has been run
+	"viur.seoKeys.legacyLookup": False,
+
 	# Priority, in which skeletons are loaded
 	"viur.skeleton.searchPath": ["/skeletons/", "/viur/core/"],  # Priority, in which skeletons are loaded
 
 	# If set, must be a tuple of two functions serializing/restoring additional environmental data in deferred requests
 	"viur.tasks.customEnvironmentHandler": None,
+	# Default amount of key-ranges processed in parallel by tasks.startShardedScan
+	"viur.tasks.shardedScan.shards": 8,
+	# Default amount of entities passed at once to the handler of a sharded scan
+	"viur.tasks.shardedScan.batchSize": 50,
+	# Seconds a task processes a shard before continuing in a new one
+	"viur.tasks.shardedScan.taskDuration": 300,
 
 	# Will be set to server.__version__ in server.__init__
 	"viur.version": None,
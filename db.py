@@ -3,17 +3,25 @@ from __future__ import annotations
 from viur.core.config import conf
 from viur.core import utils
 import logging
-from typing import Union, Tuple, List, Dict, Any, Callable
+from typing import Union, Tuple, List, Dict, Set, Any, Callable
 from functools import partial
-from itertools import zip_longest
+from itertools import chain, zip_longest
 from copy import deepcopy
 #from google.cloud import datastore, exceptions
 from viur.xeno import datastore, exceptions
 from enum import Enum
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta, timezone
+import asyncio
 import binascii
 import contextlib
-from time import time as ttime
+from hashlib import sha256
+import heapq
+import random
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar, copy_context
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import sleep, time as ttime
 
 """
 	Tiny wrapper around *google.appengine.api.datastore*.
@@ -28,6 +36,10 @@ __client__ = datastore.Client()
 
 # Consts
 KEY_SPECIAL_PROPERTY = "__key__"
+# Upper bounds for the amount of keys/entities the datastore accepts in a single *_multi call
+MAX_GET_MULTI_SIZE = 1000
+MAX_PUT_MULTI_SIZE = 500
+MAX_DELETE_MULTI_SIZE = 500
 DATASTORE_BASE_TYPES = Union[None, str, int, float, bool, datetime, date, time, datastore.Key]
 
 
@@ -82,19 +94,814 @@ def encodeKey(key: KeyClass) -> str:
 	"""
 	return key.to_legacy_urlsafe().decode("ASCII")
 
-def Get(keys: Union[KeyClass, List[KeyClass]]):
+class EntityCache(object):
+	"""
+		Process-wide LRU cache for entities fetched by :func:`Get`.
+
+		The cache is bounded by the amount of entries and their (estimated) size in bytes.
+		Which kinds are cached and for how long is controlled by conf["viur.db.caching"] and the
+		conf["viur.db.cache.*"] settings. Writes issued by this process through :func:`Put` and
+		:func:`Delete` invalidate the affected entries immediately; changes made by other instances
+		become visible once the TTL of that kind expired.
+	"""
+
+	def __init__(self):
+		super(EntityCache, self).__init__()
+		self._lock = threading.Lock()
+		self._entries: OrderedDict[KeyClass, Tuple[float, int, Entity]] = OrderedDict()
+		self._currentBytes = 0
+		self._generation = 0  # Incremented on each invalidation
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def getTTL(kind: str) -> int:
+		"""
+			Returns how many seconds entities of the given kind may be served from this cache.
+			0 means that kind is not cached at all.
+		"""
+		cachingLevel = conf["viur.db.caching"]
+		if not cachingLevel or kind in conf["viur.db.cache.excludedKinds"] \
+				or kind.endswith(tuple(conf["viur.db.cache.excludedKindSuffixes"])):
+			return 0
+		kindTTL = conf["viur.db.cache.kindTTL"]
+		if kind in kindTTL:
+			return kindTTL[kind] or 0
+		if cachingLevel == 1:  # Safe: Only cache kinds that have been explicitly configured
+			return 0
+		return conf["viur.db.cache.defaultTTL"]
+
+	@staticmethod
+	def estimateSize(value: Any) -> int:
+		"""
+			Roughly estimates the memory consumed by the given entity (or value)
+		"""
+		if isinstance(value, (str, bytes)):
+			return 49 + len(value)
+		elif isinstance(value, dict):
+			return 64 + sum([EntityCache.estimateSize(k) + EntityCache.estimateSize(v) for k, v in value.items()])
+		elif isinstance(value, (list, tuple, set)):
+			return 56 + sum([EntityCache.estimateSize(x) for x in value])
+		return 32
+
+	@property
+	def generation(self) -> int:
+		return self._generation
+
+	def getMulti(self, keys: List[KeyClass]) -> Dict[KeyClass, Entity]:
+		"""
+			Returns copies of all entities found in the cache for the given keys.
+		"""
+		res = {}
+		now = ttime()
+		with self._lock:
+			for key in keys:
+				cacheEntry = self._entries.get(key)
+				if cacheEntry is None:
+					continue
+				expires, size, entity = cacheEntry
+				if expires < now:
+					del self._entries[key]
+					self._currentBytes -= size
+					continue
+				self._entries.move_to_end(key)
+				res[key] = entity
+			self.hits += len(res)
+			self.misses += len(keys) - len(res)
+		return {k: deepcopy(v) for k, v in res.items()}
+
+	def setMulti(self, entities: List[Entity], generation: int) -> None:
+		"""
+			Stores copies of the given entities.
+
+			:param generation: The value of :attr:`generation` before these entities had been fetched.
+				If any entry has been invalidated in the meantime, we won't store anything as we might
+				overwrite that invalidation with stale data.
+		"""
+		maxEntries = conf["viur.db.cache.maxEntries"]
+		maxBytes = conf["viur.db.cache.maxBytes"]
+		now = ttime()
+		newEntries = []
+		for entity in entities:
+			if entity is None or entity.key is None or entity.key.is_partial:
+				continue
+			ttl = self.getTTL(entity.key.kind)
+			if not ttl:
+				continue
+			size = self.estimateSize(entity)
+			if size > maxBytes:
+				continue
+			newEntries.append((entity.key, (now + ttl, size, deepcopy(entity))))
+		if not newEntries:
+			return
+		with self._lock:
+			if generation != self._generation:
+				return
+			for key, cacheEntry in newEntries:
+				oldEntry = self._entries.pop(key, None)
+				if oldEntry:
+					self._currentBytes -= oldEntry[1]
+				self._entries[key] = cacheEntry
+				self._currentBytes += cacheEntry[1]
+			while self._entries and (len(self._entries) > maxEntries or self._currentBytes > maxBytes):
+				_, (_, size, _) = self._entries.popitem(last=False)
+				self._currentBytes -= size
+
+	def invalidate(self, keys: List[KeyClass]) -> None:
+		"""
+			Removes the given keys from the cache.
+		"""
+		with self._lock:
+			self._generation += 1
+			for key in keys:
+				cacheEntry = self._entries.pop(key, None)
+				if cacheEntry:
+					self._currentBytes -= cacheEntry[1]
+
+	def flush(self) -> None:
+		"""
+			Drops all cached entities.
+		"""
+		with self._lock:
+			self._generation += 1
+			self._entries.clear()
+			self._currentBytes = 0
+
+	def getStats(self) -> Dict[str, int]:
+		"""
+			Returns the current fill level of this cache and how many lookups could be served from it.
+		"""
+		with self._lock:
+			return {
+				"entries": len(self._entries),
+				"bytes": self._currentBytes,
+				"hits": self.hits,
+				"misses": self.misses,
+			}
+
+
+entityCache = EntityCache()
+
+
+class QueryCache(object):
+	"""
+		Process-wide cache for the results of :func:`Query.run`.
+
+		Entries are keyed by a canonical hash of the query (kind, filters, orders, distinct, cursors and limit).
+		Each entry records the generation counter of the kinds it has been built from. Any :func:`Put` or
+		:func:`Delete` on one of these kinds bumps its counter, so all results depending on that kind become
+		stale at once without having to scan the cached entries.
+
+		Only kinds listed in conf["viur.db.queryCache.kindTTL"] are cached. As with the entity cache, writes
+		made by other instances become visible once the TTL of that kind expired.
+	"""
+
+	def __init__(self):
+		super(QueryCache, self).__init__()
+		self._lock = threading.Lock()
+		self._entries: OrderedDict[str, Tuple[float, Tuple[int, ...], int, List[Entity], Any]] = OrderedDict()
+		self._currentBytes = 0
+		self._kindGenerations: Dict[str, int] = {}
+		self._stats: Dict[str, Dict[str, int]] = {}
+
+	@staticmethod
+	def getTTL(kind: str) -> int:
+		"""
+			Returns how many seconds query results for the given kind may be served from this cache.
+			0 means queries for that kind are not cached.
+		"""
+		if not conf["viur.db.caching"]:
+			return 0
+		return conf["viur.db.queryCache.kindTTL"].get(kind) or 0
+
+	def getCacheKey(self, query: Query, limit: int) -> Union[None, str]:
+		"""
+			Returns the canonical hash for the given query or None if that query must not be served from cache.
+		"""
+		if not self.getTTL(query.origKind) or IsInTransaction() or query._fulltextQueryString \
+				or query._customMultiQueryMerge or query._calculateInternalMultiQueryAmount:
+			return None
+		filters = query.filters
+		if isinstance(filters, dict):
+			filters = sorted(filters.items())
+		else:
+			filters = [sorted(x.items()) for x in filters]
+		canonical = repr((query.kind, query.origKind, filters, query.orders, query._distinct,
+						  query._startCursor, query._endCursor, query._projection, limit))
+		return sha256(canonical.encode("UTF-8")).hexdigest()
+
+	def getGenerations(self, kinds: Tuple[str, ...]) -> Tuple[int, ...]:
+		"""
+			Returns the current generation counters of the given kinds.
+		"""
+		with self._lock:
+			return tuple([self._kindGenerations.get(x, 0) for x in kinds])
+
+	def get(self, cacheKey: str, kinds: Tuple[str, ...]) -> Union[None, Tuple[List[Entity], Any]]:
+		"""
+			Returns a copy of the cached result and its cursor for the given cacheKey or None if there's no
+			valid entry.
+
+			:param kinds: The kinds that query has been built from; used for recording hit rates.
+		"""
+		now = ttime()
+		res = None
+		with self._lock:
+			stats = self._stats.setdefault(kinds[-1], {"hits": 0, "misses": 0})
+			cacheEntry = self._entries.get(cacheKey)
+			if cacheEntry is not None:
+				expires, generations, size, entities, cursor = cacheEntry
+				if expires < now or generations != tuple([self._kindGenerations.get(x, 0) for x in kinds]):
+					del self._entries[cacheKey]
+					self._currentBytes -= size
+				else:
+					self._entries.move_to_end(cacheKey)
+					res = entities, cursor
+			if res is None:
+				stats["misses"] += 1
+				return None
+			stats["hits"] += 1
+		return deepcopy(res[0]), res[1]
+
+	def set(self, cacheKey: str, kinds: Tuple[str, ...], generations: Tuple[int, ...], entities: List[Entity],
+			cursor: Any) -> None:
+		"""
+			Stores a copy of the given result.
+
+			:param generations: The generation counters of *kinds* read before that query had been run.
+				If any of these kinds has been written in the meantime, the entry will never be served.
+		"""
+		maxEntries = conf["viur.db.queryCache.maxEntries"]
+		maxBytes = conf["viur.db.queryCache.maxBytes"]
+		size = EntityCache.estimateSize(entities)
+		if size > maxBytes:
+			return
+		cacheEntry = (ttime() + self.getTTL(kinds[-1]), generations, size, deepcopy(entities), cursor)
+		with self._lock:
+			oldEntry = self._entries.pop(cacheKey, None)
+			if oldEntry:
+				self._currentBytes -= oldEntry[2]
+			self._entries[cacheKey] = cacheEntry
+			self._currentBytes += size
+			while self._entries and (len(self._entries) > maxEntries or self._currentBytes > maxBytes):
+				_, oldEntry = self._entries.popitem(last=False)
+				self._currentBytes -= oldEntry[2]
+
+	def invalidateKinds(self, kinds: Set[str]) -> None:
+		"""
+			Marks all cached results built from one of the given kinds as stale.
+		"""
+		with self._lock:
+			for kind in kinds:
+				self._kindGenerations[kind] = self._kindGenerations.get(kind, 0) + 1
+
+	def flush(self) -> None:
+		"""
+			Drops all cached query results.
+		"""
+		with self._lock:
+			self._entries.clear()
+			self._currentBytes = 0
+
+	def getStats(self) -> Dict[str, Any]:
+		"""
+			Returns the current fill level of this cache and the hit rates per kind.
+		"""
+		with self._lock:
+			kinds = {}
+			for kind, stats in self._stats.items():
+				lookups = stats["hits"] + stats["misses"]
+				kinds[kind] = dict(stats, hitRate=stats["hits"] / lookups if lookups else 0.0)
+			return {
+				"entries": len(self._entries),
+				"bytes": self._currentBytes,
+				"kinds": kinds,
+			}
+
+
+queryCache = QueryCache()
+
+
+class QueryShapeRecorder(object):
+	"""
+		Records the shape (kind, equality properties, inequality properties, orders, distinct on and projection)
+		of each query run by this instance, together with its latency and result counts.
+
+		These shapes can be exported as composite index definitions (index.yaml) by
+		:func:`exportIndexDefinitions`, which also points out queries that had to be merged and resorted in memory.
+		Recording is enabled by conf["viur.db.recordQueryShapes"].
+	"""
+	inequalityOperators = {"<", ">", "<=", ">="}
+
+	def __init__(self):
+		super(QueryShapeRecorder, self).__init__()
+		self._lock = threading.Lock()
+		self._shapes: Dict[Tuple, Dict[str, Any]] = {}
+
+	@staticmethod
+	def getShape(query: Query) -> Tuple:
+		"""
+			Returns the shape of the given query as hashable tuple.
+		"""
+		filters = query.filters[0] if isinstance(query.filters, list) else query.filters
+		equalities, inequalities = set(), set()
+		for k in filters.keys():
+			prop, op = k.split(" ")
+			if op in QueryShapeRecorder.inequalityOperators:
+				inequalities.add(prop)
+			else:
+				equalities.add(prop)
+		orders = tuple([(prop, order == SortOrder.Ascending) for prop, order in query._getDatastoreOrders()])
+		inMemory = None
+		if query._customMultiQueryMerge:
+			inMemory = "custom merge of %s sub-queries" % len(query.filters)
+		elif isinstance(query.filters, list):
+			inMemory = "%s sub-queries merged and resorted in memory" % len(query.filters)
+		return (query.kind, tuple(sorted(equalities)), tuple(sorted(inequalities)), orders,
+				tuple(query._distinct or ()), tuple(query._projection or ()), inMemory)
+
+	def record(self, query: Query, duration: float, resultCount: int) -> None:
+		"""
+			Records one run of the given query.
+
+			:param duration: Seconds it took to run that query
+			:param resultCount: Amount of entities returned
+		"""
+		shape = self.getShape(query)
+		with self._lock:
+			stats = self._shapes.get(shape)
+			if stats is None:
+				if len(self._shapes) >= conf["viur.db.recordQueryShapes.maxShapes"]:
+					return
+				stats = self._shapes[shape] = {"count": 0, "totalTime": 0.0, "maxTime": 0.0,
+											   "totalResults": 0, "maxResults": 0}
+				logging.info("New query shape for %s: equality %s, inequality %s, orders %s, distinct on %s%s" % (
+					shape[0], list(shape[1]), list(shape[2]), list(shape[3]), list(shape[4]),
+					" (%s)" % shape[6] if shape[6] else ""))
+			stats["count"] += 1
+			stats["totalTime"] += duration
+			stats["maxTime"] = max(stats["maxTime"], duration)
+			stats["totalResults"] += resultCount
+			stats["maxResults"] = max(stats["maxResults"], resultCount)
+
+	def getShapes(self) -> List[Dict[str, Any]]:
+		"""
+			Returns all shapes recorded so far along with their statistics, slowest (in total) first.
+		"""
+		res = []
+		with self._lock:
+			for shape, stats in self._shapes.items():
+				kind, equalities, inequalities, orders, distinct, projection, inMemory = shape
+				res.append(dict(stats, kind=kind, equalities=list(equalities), inequalities=list(inequalities),
+								orders=[(prop, SortOrder.Ascending if asc else SortOrder.Descending) for prop, asc in orders],
+								distinct=list(distinct), projection=list(projection), inMemory=inMemory,
+								avgTime=stats["totalTime"] / stats["count"],
+								avgResults=stats["totalResults"] / stats["count"]))
+		res.sort(key=lambda x: x["totalTime"], reverse=True)
+		return res
+
+	def reset(self) -> None:
+		"""
+			Drops all recorded shapes.
+		"""
+		with self._lock:
+			self._shapes.clear()
+
+	@staticmethod
+	def getIndexProperties(shape: Dict[str, Any]) -> Union[None, List[Tuple[str, bool]]]:
+		"""
+			Returns the properties (name, ascending) of the composite index required to serve the given shape,
+			or None if the built-in indexes are sufficient.
+		"""
+		orders = [(prop, order == SortOrder.Ascending) for prop, order in shape["orders"]]
+		if orders and orders[-1] == (KEY_SPECIAL_PROPERTY, True):
+			orders = orders[:-1]  # Entities are implicitly sorted by their key
+		res = [(x, True) for x in shape["equalities"] if x not in [y[0] for y in orders]]
+		for prop in shape["inequalities"]:
+			if prop not in [x[0] for x in orders]:
+				res.append((prop, True))
+		res.extend(orders)
+		for prop in shape["projection"]:
+			if prop not in [x[0] for x in res]:
+				res.append((prop, True))
+		if len(res) < 2:
+			return None  # Served by the single property index
+		if not orders and not shape["inequalities"] and not shape["projection"]:
+			return None  # Equality filters only; served by merge-joining the single property indexes
+		return res
+
+	def exportIndexDefinitions(self) -> str:
+		"""
+			Returns the composite indexes required by the shapes recorded so far in index.yaml format.
+			Each index is annotated with the shapes it serves; shapes that had been merged and resorted
+			in memory are listed as warnings.
+		"""
+		indexes = OrderedDict()
+		warnings = []
+		for shape in self.getShapes():
+			comment = "# %s: %s runs, avg %.1f ms, max %.1f ms, avg %.1f results; equality %s, inequality %s, orders %s" % (
+				shape["kind"], shape["count"], shape["avgTime"] * 1000, shape["maxTime"] * 1000, shape["avgResults"],
+				shape["equalities"], shape["inequalities"],
+				["%s %s" % (prop, "asc" if order == SortOrder.Ascending else "desc") for prop, order in shape["orders"]])
+			if shape["inMemory"]:
+				warnings.append("%s (%s)" % (comment, shape["inMemory"]))
+			if len(shape["inequalities"]) > 1:
+				warnings.append("%s (inequality filters on multiple properties)" % comment)
+				continue
+			properties = self.getIndexProperties(shape)
+			if properties is None:
+				continue
+			indexes.setdefault((shape["kind"], tuple(properties)), []).append(comment)
+		res = []
+		if warnings:
+			res.append("# Queries falling back to in-memory merging / resorting:")
+			res.extend(warnings)
+			res.append("")
+		res.append("indexes:")
+		for (kind, properties), comments in indexes.items():
+			res.append("")
+			res.extend(comments)
+			res.append("- kind: %s" % kind)
+			res.append("  properties:")
+			for prop, ascending in properties:
+				res.append("  - name: %s" % prop)
+				if not ascending:
+					res.append("    direction: desc")
+		return "\n".join(res) + "\n"
+
+
+queryShapeRecorder = QueryShapeRecorder()
+
+
+class WriteBuffer(object):
+	"""
+		Collects Puts and Deletes so they can be sent to the datastore in as few calls as possible.
+
+		Only the last mutation for each key is kept. Reads issued through :func:`Get` see the pending version
+		of buffered entities; queries don't. Each transaction started by :func:`RunInTransaction` has its own
+		buffer which is flushed right before the transaction commits. Outside transactions, a buffer can be
+		opened using :func:`bufferWrites`.
+	"""
+
+	def __init__(self):
+		super(WriteBuffer, self).__init__()
+		self._pending: OrderedDict[KeyClass, Union[None, Entity]] = OrderedDict()
+
+	def __len__(self):
+		return len(self._pending)
+
+	def put(self, entities: List[Entity]) -> None:
+		"""
+			Records copies of the given entities (which must have complete keys) to be written on flush.
+		"""
+		for entity in entities:
+			self._pending[entity.key] = deepcopy(entity)
+
+	def delete(self, keys: List[KeyClass]) -> None:
+		"""
+			Records the given keys to be deleted on flush.
+		"""
+		for key in keys:
+			self._pending[key] = None
+
+	def getMulti(self, keys: List[KeyClass]) -> Dict[KeyClass, Union[None, Entity]]:
+		"""
+			Returns copies of the pending versions of the given keys. Keys pending deletion map to None,
+			keys not buffered are omitted.
+		"""
+		return {k: deepcopy(self._pending[k]) for k in keys if k in self._pending}
+
+	def flush(self) -> None:
+		"""
+			Sends all pending mutations to the datastore.
+		"""
+		if not self._pending:
+			return
+		puts = [v for v in self._pending.values() if v is not None]
+		deletes = [k for k, v in self._pending.items() if v is None]
+		self._pending = OrderedDict()
+		if puts:
+			_putEntities(puts)
+		if deletes:
+			_deleteKeys(deletes)
+
+
+_currentWriteBuffer = ContextVar("DB-WriteBuffer", default=None)
+
+
+def _getWriteBuffer() -> Union[None, WriteBuffer]:
+	"""
+		Returns the write buffer of the current transaction or :func:`bufferWrites` scope (if any).
+	"""
+	txn = __client__.current_transaction
+	if txn is not None:
+		if not conf["viur.db.bufferTransactionWrites"]:
+			return None
+		return getattr(txn, "viurWriteBuffer", None)
+	return _currentWriteBuffer.get()
+
+
+@contextlib.contextmanager
+def bufferWrites():
+	"""
+		Defers all Puts and Deletes issued inside this block until it's left and sends them in
+		as few calls as possible. Entities with partial keys are written immediately.
+
+		Usage::
+
+			with db.bufferWrites():
+				for entity in entities:
+					...
+					db.Put(entity)
+
+		Nested scopes are merged into the outermost one. Transactions started inside this block
+		flush the pending writes first.
+	"""
+	if _currentWriteBuffer.get() is not None or IsInTransaction():
+		yield
+		return
+	writeBuffer = WriteBuffer()
+	token = _currentWriteBuffer.set(writeBuffer)
+	try:
+		yield
+	finally:
+		_currentWriteBuffer.reset(token)
+		writeBuffer.flush()
+
+
+__bulkExecutor__ = None
+__asyncExecutor__ = None
+__bulkExecutorLock__ = threading.Lock()
+
+
+def _runConcurrently(func: Callable[[Any], Any], argsList: List[Any]) -> List[Any]:
+	"""
+		Calls *func* once for each element in *argsList*. If there's more than one call to make, these
+		are run concurrently on a bounded thread pool.
+
+		Inside transactions, the calls are made one after another in the calling thread,
+		as the transaction is bound to that thread.
+
+		:returns: The list of results returned by func, in the order of argsList
+	"""
+	if len(argsList) < 2 or IsInTransaction() or conf["viur.db.bulkThreads"] < 2:
+		return [func(x) for x in argsList]
+	return list(_getBulkExecutor().map(func, argsList))
+
+
+def _getBulkExecutor() -> ThreadPoolExecutor:
+	"""
+		Returns the thread pool used for concurrent datastore operations, creating it on first use.
+	"""
+	global __bulkExecutor__
+	if __bulkExecutor__ is None:
+		with __bulkExecutorLock__:
+			if __bulkExecutor__ is None:
+				__bulkExecutor__ = ThreadPoolExecutor(max_workers=conf["viur.db.bulkThreads"],
+													  thread_name_prefix="viur-db-bulk")
+	return __bulkExecutor__
+
+
+async def _runAsync(func: Callable[..., Any], *args, **kwargs) -> Any:
+	"""
+		Runs func(*args, **kwargs) on a thread pool without blocking the event loop and returns its result.
+
+		The ContextVars of the caller (currentRequest, currentSession, ..) are propagated to that thread.
+		Inside transactions, the call is made immediately in the calling thread (blocking), as the
+		transaction is bound to that thread.
+	"""
+	global __asyncExecutor__
+	if IsInTransaction():
+		return func(*args, **kwargs)
+	if __asyncExecutor__ is None:
+		with __bulkExecutorLock__:
+			if __asyncExecutor__ is None:
+				# Not shared with the bulk executor, as these calls might use that one themselves
+				__asyncExecutor__ = ThreadPoolExecutor(max_workers=conf["viur.db.asyncThreads"],
+													   thread_name_prefix="viur-db-async")
+	ctx = copy_context()
+	return await asyncio.get_running_loop().run_in_executor(__asyncExecutor__,
+															partial(ctx.run, func, *args, **kwargs))
+
+
+def _runInBackground(func: Callable[..., Any], *args, **kwargs) -> Future:
+	"""
+		Schedules func(*args, **kwargs) on the bulk thread pool and returns a Future for its result.
+
+		Inside transactions (or if concurrency has been disabled) the call is made immediately in the
+		calling thread and an already completed Future is returned.
+	"""
+	if IsInTransaction() or conf["viur.db.bulkThreads"] < 2:
+		res = Future()
+		try:
+			res.set_result(func(*args, **kwargs))
+		except Exception as e:
+			res.set_exception(e)
+		return res
+	return _getBulkExecutor().submit(func, *args, **kwargs)
+
+
+def _runChunked(func: Callable[[List[Any]], Any], items: List[Any], chunkSize: int) -> List[Any]:
+	"""
+		Splits *items* into chunks of at most *chunkSize* elements and calls *func* once for each chunk
+		using :func:`_runConcurrently`.
+
+		:returns: The list of results returned by func, in the order of the chunks
+	"""
+	return _runConcurrently(func, [items[x:x + chunkSize] for x in range(0, len(items), chunkSize)])
+
+
+def _fetchEntities(keys: List[KeyClass], useCache: bool = True) -> Dict[KeyClass, Entity]:
+	"""
+		Fetches the given keys from the process wide entity cache or the datastore.
+		Inside transactions or if useCache is False, the entity cache is bypassed; the entities read
+		are recorded in the cache nevertheless.
+
+		:returns: Dictionary of key -> entity for each entity found.
+	"""
+	inTransaction = IsInTransaction()
+	if inTransaction:
+		# Remember what we've read, so contention can be attributed to these kinds should this transaction fail
+		txn = __client__.current_transaction
+		if not "viurReadKeys" in dir(txn):
+			txn.viurReadKeys = set()
+		txn.viurReadKeys.update(keys)
+	res = entityCache.getMulti(keys) if useCache and not inTransaction else {}
+	missingKeys = [x for x in keys if x not in res]
+	if not missingKeys:
+		return res
+	generation = entityCache.generation
+	if len(missingKeys) == 1:
+		fetchedEntities = [__client__.get(missingKeys[0])]
+	else:
+		# Duplicate keys are only requested once
+		fetchedEntities = chain(*_runChunked(__client__.get_multi, list(dict.fromkeys(missingKeys)),
+											 MAX_GET_MULTI_SIZE))
+	fetchedEntities = [x for x in fetchedEntities if x is not None]
+	for entity in fetchedEntities:
+		res[entity.key] = entity
+	if not inTransaction:
+		entityCache.setMulti(fetchedEntities, generation)
+	return res
+
+
+def _invalidateKeys(keys: List[KeyClass]) -> None:
+	"""
+		Informs our caches that the given keys have been written or deleted.
+		Inside a transaction, these keys will be invalidated again once the transaction commits.
+	"""
+	entityCache.invalidate(keys)
+	queryCache.invalidateKinds({x.kind for x in keys})
+	txn = __client__.current_transaction
+	if txn is not None:
+		if not "viurWrittenKeys" in dir(txn):
+			txn.viurWrittenKeys = set()
+		txn.viurWrittenKeys.update(keys)
+
+
+def _getIdentityMap() -> Union[None, Dict[KeyClass, Union[None, Entity]]]:
+	"""
+		Returns the entity identity map of the current request or None if we're not inside a
+		request (warmup, deferred code running inline) or the map has been disabled.
+
+		The map is keyed by the (complete) key of an entity. A value of None records that we already
+		looked that key up and it did not exist.
+	"""
+	if not conf["viur.db.identityMap"]:
+		return None
+	req = utils.currentRequest.get()
+	if req is None:
+		return None
+	return getattr(req, "dbIdentityMap", None)
+
+
+def _updateIdentityMapStats(hits: int, misses: int) -> None:
+	req = utils.currentRequest.get()
+	stats = getattr(req, "dbIdentityMapStats", None)
+	if stats is not None:
+		stats["hits"] += hits
+		stats["misses"] += misses
+
+
+def getIdentityMapStats() -> Dict[str, int]:
+	"""
+		Returns how many keys requested by :func:`Get` in the current request could be served from
+		the identity map (hits) and how many had to be fetched from the datastore (misses).
+	"""
+	stats = getattr(utils.currentRequest.get(), "dbIdentityMapStats", None)
+	return dict(stats) if stats else {"hits": 0, "misses": 0}
+
+
+def queueFetch(keys: List[KeyClass]) -> bool:
+	"""
+		Queues the given keys to be fetched with the next call to :func:`fetchQueued` in this request.
+
+		This allows code resolving many keys one after another (eg. templates fetching the entries referenced
+		by each row of a list) to fetch them all in one batch instead. Does nothing outside requests or if the
+		identity map is disabled, as there's no place to keep the results.
+
+		:returns: True if any of these keys has been queued, False if they're already known (or can't be queued)
+	"""
+	identityMap = _getIdentityMap()
+	if identityMap is None:
+		return False
+	missingKeys = [x for x in keys if x not in identityMap]
+	utils.currentRequest.get().dbFetchQueue.update(missingKeys)
+	return bool(missingKeys)
+
+
+def fetchQueued() -> None:
+	"""
+		Fetches all keys queued by :func:`queueFetch` with one :func:`GetMulti` call. The entities are recorded
+		in the identity map, so :func:`Get` will serve them from memory for the rest of this request.
+	"""
+	queue = getattr(utils.currentRequest.get(), "dbFetchQueue", None)
+	if not queue:
+		return
+	keys = list(queue)
+	queue.clear()
+	if not IsInTransaction():
+		_getEntities(keys)
+
+
+def _getEntities(keys: List[KeyClass], ignoreWriteBuffer: bool = False,
+				 useCache: bool = True) -> Dict[KeyClass, Union[None, Entity]]:
+	"""
+		Resolves the given keys using the pending writes of the current write buffer, the identity map of
+		the current request (if any) and :func:`_fetchEntities` for the remaining ones.
+		If useCache is False, the identity map and the entity cache are bypassed.
+	"""
+	writeBuffer = None if ignoreWriteBuffer else _getWriteBuffer()
+	if writeBuffer is not None:
+		pendingEntities = writeBuffer.getMulti(keys)
+		if pendingEntities:
+			res = {k: v for k, v in pendingEntities.items()}
+			missingKeys = [x for x in keys if x not in pendingEntities]
+			if missingKeys:
+				res.update(_getEntities(missingKeys, ignoreWriteBuffer=True, useCache=useCache))
+			return res
+	identityMap = None if IsInTransaction() or not useCache else _getIdentityMap()
+	if identityMap is None:
+		return _fetchEntities(keys, useCache)
+	missingKeys = [x for x in keys if x not in identityMap]
+	if missingKeys:
+		fetchedEntities = _fetchEntities(missingKeys)
+		for key in missingKeys:
+			identityMap[key] = fetchedEntities.get(key)
+	_updateIdentityMapStats(len(keys) - len(missingKeys), len(missingKeys))
+	# Hand out copies only - changes made by the caller must not show up in later calls unless they're written
+	return {k: deepcopy(identityMap[k]) for k in dict.fromkeys(keys)}
+
+
+def Get(keys: Union[KeyClass, List[KeyClass]], useCache: bool = True):
+	"""
+		Fetch one or more entities from the datastore.
+
+		Outside transactions, entities are served from (and recorded in) the identity map of the
+		current request, so fetching the same key again won't cause another round-trip. Each call returns
+		its own copies, so modifying them doesn't affect later calls until they're written with :func:`Put`.
+		Inside transactions we'll always read from the datastore.
+
+		:param keys: A single key or a list of keys
+		:param useCache: If False, the identity map and the process-wide entity cache are bypassed and the
+			current version is read from the datastore (eg. to propagate a change made on another instance).
+		:returns: The entity (or None) for a single key, the list of entities found (in the order
+			of keys requested) otherwise. Use :func:`GetMulti` if you need a placeholder for missing
+			entities.
+	"""
 	if isinstance(keys, list):
-		# GetMulti does not obey orderings - results can be returned in any order. We'll need to fix this here
-		resList = list(__client__.get_multi(keys))
-		resList.sort(key=lambda x: keys.index(x.key) if x else -1)
-		return resList
-	return __client__.get(keys)
+		entities = _getEntities(keys, useCache=useCache)
+		return [entities[x] for x in keys if entities.get(x) is not None]
+	return _getEntities([keys], useCache=useCache).get(keys)
+
+
+def GetMulti(keys: List[KeyClass], useCache: bool = True) -> List[Union[None, Entity]]:
+	"""
+		Fetch a list of entities from the datastore.
+
+		Unlike :func:`Get`, the result always lines up with the given keys: The n-th entry is the
+		entity for the n-th key or None if that entity does not exist. Large lists are split
+		into chunks the datastore accepts and fetched concurrently.
+
+		:param keys: List of keys to fetch, may contain duplicates
+		:param useCache: If False, the identity map and the process-wide entity cache are bypassed
+		:returns: List of entities or None
+	"""
+	entities = _getEntities(keys, useCache=useCache)
+	return [entities.get(x) for x in keys]
 
 
 def Put(entity: Union[Entity, List[Entity]]):
 	"""
 		Save an entity in the Cloud Datastore.
 		Also ensures that no string-key with an digit-only name can be used.
+
+		Large lists are split into chunks the datastore accepts and written concurrently
+		(or one after another if we're inside a transaction).
+
+		Inside transactions and :func:`bufferWrites` scopes, the write is deferred until that transaction
+		commits or the scope is left (see :class:`WriteBuffer`).
+
 		:param entity: The entity to be saved to the datastore.
 	"""
 	if not isinstance(entity, list):
@@ -103,17 +910,105 @@ def Put(entity: Union[Entity, List[Entity]]):
 		if not e.key.is_partial and e.key.name and e.key.name.isdigit():
 			raise ValueError("Cannot store an entity with digit-only string key")
 	# fixUnindexableProperties(e)
-	return __client__.put_multi(entities=entity)
+	writeBuffer = _getWriteBuffer()
+	if writeBuffer is not None:
+		# Entities with partial keys are written immediately, as their callers expect them to have a complete key
+		writeBuffer.put([e for e in entity if not e.key.is_partial])
+		entity = [e for e in entity if e.key.is_partial]
+		if not entity:
+			return
+	_putEntities(entity)
+
+
+def _putEntities(entity: List[Entity]) -> None:
+	"""
+		Writes the given entities to the datastore and updates our caches accordingly.
+	"""
+	_runChunked(lambda x: __client__.put_multi(entities=x), entity, MAX_PUT_MULTI_SIZE)
+	_invalidateKeys([e.key for e in entity if not e.key.is_partial])
+	identityMap = _getIdentityMap()
+	if identityMap is not None:
+		inTransaction = IsInTransaction()
+		for e in entity:
+			if inTransaction or e.key.is_partial:
+				# This write might still be rolled back - just forget what we know about that key
+				identityMap.pop(e.key, None)
+			else:
+				identityMap[e.key] = deepcopy(e)  # The caller might continue to modify its instance
 
 
 def Delete(keys: Union[Entity, List[Entity], KeyClass, List[KeyClass]]):
+	"""
+		Deletes one or more entities from the datastore.
+
+		Large lists are split into chunks the datastore accepts and deleted concurrently
+		(or one after another if we're inside a transaction).
+
+		Inside transactions and :func:`bufferWrites` scopes, the deletion is deferred until that transaction
+		commits or the scope is left (see :class:`WriteBuffer`).
+
+		:param keys: A key, an entity or a list of keys/entities to delete.
+	"""
 	if isinstance(keys, list):
-		return __client__.delete_multi([(x if isinstance(x, KeyClass) else x.key) for x in keys])
+		keys = [(x if isinstance(x, KeyClass) else x.key) for x in keys]
 	else:
-		if isinstance(keys, KeyClass):
-			return __client__.delete(keys)
-		else:
-			return __client__.delete(keys.key)
+		keys = [keys if isinstance(keys, KeyClass) else keys.key]
+	writeBuffer = _getWriteBuffer()
+	if writeBuffer is not None:
+		writeBuffer.delete(keys)
+		return
+	_deleteKeys(keys)
+
+
+def _deleteKeys(keys: List[KeyClass]) -> None:
+	"""
+		Deletes the given keys from the datastore and updates our caches accordingly.
+	"""
+	if len(keys) == 1:
+		__client__.delete(keys[0])
+	else:
+		_runChunked(__client__.delete_multi, keys, MAX_DELETE_MULTI_SIZE)
+	_invalidateKeys(keys)
+	identityMap = _getIdentityMap()
+	if identityMap is not None:
+		inTransaction = IsInTransaction()
+		for key in keys:
+			if inTransaction:
+				identityMap.pop(key, None)
+			else:
+				identityMap[key] = None
+
+
+async def GetAsync(keys: Union[KeyClass, List[KeyClass]], useCache: bool = True):
+	"""
+		Awaitable version of :func:`Get`.
+
+		Usage::
+
+			user, files = await asyncio.gather(db.GetAsync(userKey), db.GetAsync(fileKeys))
+	"""
+	return await _runAsync(Get, keys, useCache=useCache)
+
+
+async def GetMultiAsync(keys: List[KeyClass], useCache: bool = True) -> List[Union[None, Entity]]:
+	"""
+		Awaitable version of :func:`GetMulti`.
+	"""
+	return await _runAsync(GetMulti, keys, useCache=useCache)
+
+
+async def PutAsync(entity: Union[Entity, List[Entity]]) -> None:
+	"""
+		Awaitable version of :func:`Put`.
+	"""
+	return await _runAsync(Put, entity)
+
+
+async def DeleteAsync(keys: Union[Entity, List[Entity], KeyClass, List[KeyClass]]) -> None:
+	"""
+		Awaitable version of :func:`Delete`.
+	"""
+	return await _runAsync(Delete, keys)
 
 
 def fixUnindexableProperties(entry: Entity):
@@ -200,6 +1095,126 @@ def GetOrInsert(key: Key, **kwargs):
 	return RunInTransaction(txn, key, kwargs)
 
 
+class _InvertedSortValue(object):
+	"""
+		Wraps a sort value so that it compares in reverse order (used for descending orderings)
+	"""
+	__slots__ = ["value"]
+
+	def __init__(self, value):
+		self.value = value
+
+	def __lt__(self, other):
+		return other.value < self.value
+
+	def __eq__(self, other):
+		return self.value == other.value
+
+
+def _keySortValue(key: KeyClass) -> Tuple:
+	"""
+		Returns a comparable representation of *key*. Like in the datastore, numeric ids sort before names.
+	"""
+	res = []
+	for idx, part in enumerate(key.flat_path):
+		if idx % 2:
+			res.append((0, part, "") if isinstance(part, int) else (1, 0, part))
+		else:
+			res.append(part)
+	return tuple(res)
+
+
+def _timestampMicroseconds(value: datetime) -> int:
+	"""
+		Returns the microseconds since the epoch of *value*, which is how the datastore stores (and sorts)
+		timestamps. Naive values are taken as UTC.
+	"""
+	if value.tzinfo is not None:
+		value = value.astimezone(timezone.utc).replace(tzinfo=None)
+	return (value - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+
+def _typedSortValue(value: Any) -> Tuple:
+	"""
+		Returns a comparable representation of a single property value.
+		As values of different types cannot be compared in Python3, we group them by their type first, in
+		the order the datastore sorts mixed types: null, integers and timestamps (compared with each other),
+		booleans, byte strings, unicode strings, floats, geographical points and keys.
+	"""
+	if value is None:
+		return 0, 0
+	elif isinstance(value, bool):
+		return 2, value
+	elif isinstance(value, int):
+		return 1, value
+	elif isinstance(value, datetime):
+		return 1, _timestampMicroseconds(value)
+	elif isinstance(value, date):
+		return 1, _timestampMicroseconds(datetime.combine(value, time()))
+	elif isinstance(value, bytes):
+		return 3, value
+	elif isinstance(value, str):
+		return 4, value
+	elif isinstance(value, float):
+		return 5, value
+	elif hasattr(value, "latitude") and hasattr(value, "longitude"):  # GeoPoint
+		return 6, (value.latitude, value.longitude)
+	elif isinstance(value, KeyClass):
+		return 7, _keySortValue(value)
+	return 8, str(value)  # Embedded entities and the like don't have a useful sort-order
+
+
+def _getSortValue(entity: Entity, fieldPath: str, direction: SortOrder) -> Tuple:
+	"""
+		Determines the value the datastore would sort *entity* by for the given property.
+		Like in the datastore, the smallest value of a list determines its position when sorting ascending,
+		the largest one if sorting descending.
+	"""
+	if fieldPath == KEY_SPECIAL_PROPERTY:
+		return _typedSortValue(entity.key)
+	if fieldPath in entity:
+		values = [entity[fieldPath]]
+	else:  # Descent into embedded entities
+		values = [entity]
+		for part in fieldPath.split("."):
+			nextValues = []
+			for value in values:
+				for subValue in (value if isinstance(value, list) else [value]):
+					if isinstance(subValue, dict) and part in subValue:
+						nextValues.append(subValue[part])
+			values = nextValues
+	flatValues = []
+	for value in values:
+		if isinstance(value, list):
+			flatValues.extend(value)
+		else:
+			flatValues.append(value)
+	if not flatValues:
+		return _typedSortValue(None)
+	typedValues = [_typedSortValue(x) for x in flatValues]
+	if direction != SortOrder.Ascending:
+		return max(typedValues)
+	return min(typedValues)
+
+
+def _getSortKeyFunc(orders: List[Tuple[str, SortOrder]]) -> Callable[[Entity], Tuple]:
+	"""
+		Returns a function that computes a sort key for an entity, so that sorting (ascending) by
+		that key restores the order specified by *orders*.
+	"""
+
+	def sortKey(entity: Entity) -> Tuple:
+		res = []
+		for fieldPath, direction in orders:
+			value = _getSortValue(entity, fieldPath, direction)
+			if direction != SortOrder.Ascending:
+				value = _InvertedSortValue(value)
+			res.append(value)
+		return tuple(res)
+
+	return sortKey
+
+
 class Query(object):
 	"""
 		Base Class for querying the firestore
@@ -230,6 +1245,8 @@ class Query(object):
 		self._fulltextQueryString: Union[None, str] = None
 		self.lastCursor = None
 		self._distinct = None
+		self._projection: Union[None, List[str]] = None  # Datastore properties to project
+		self._projectedBones: Union[None, Set[str]] = None  # Bones of srcSkel populated by that projection
 
 	def setFilterHook(self, hook):
 		"""
@@ -515,6 +1532,49 @@ class Query(object):
 		self._distinct = keyList
 		return self
 
+	def setProjection(self, projection: Union[None, bool, List[str]]) -> Query:
+		"""
+			Only load the given properties from the datastore instead of whole entities.
+
+			If this query has been created using skel.all(), *projection* lists the names of the bones to load
+			(or is True to load all bones of the (sub-)skeleton this query has been created from). These
+			bones must be indexed and can't be multiple, translated or store embedded entities.
+			Skeletons returned by :func:`fetch` will only contain these bones; accessing any other bone raises
+			an :exc:`UnprojectedBoneError`.
+
+			Without a skeleton, *projection* is the list of property names to load.
+
+			:warning: Projection queries require a composite index containing all projected properties.
+
+			:param projection: The bones (or properties) to load or None to load whole entities again
+			:raises: :exc:`ValueError` if a bone can't be loaded from a projection
+		"""
+		if projection is None or projection is False:
+			self._projection = None
+			self._projectedBones = None
+			return self
+		if self.srcSkel is None:
+			if projection is True:
+				raise ValueError("Cannot derive the projection without a skeleton")
+			self._projection = list(projection)
+			self._projectedBones = None
+			return self
+		if projection is True:
+			projection = list(self.srcSkel.boneMap.keys())
+		properties = []
+		for boneName in projection:
+			bone = self.srcSkel.boneMap.get(boneName)
+			if bone is None:
+				raise ValueError("%s has no bone named %s" % (self.srcSkel.skeletonCls.__name__, boneName))
+			boneProperties = bone.getProjectionProperties(boneName)
+			if boneProperties is None:
+				raise ValueError("Bone %s of %s can't be loaded from a projection query"
+								 % (boneName, self.srcSkel.skeletonCls.__name__))
+			properties.extend([x for x in boneProperties if x not in properties])
+		self._projection = properties
+		self._projectedBones = set(projection)
+		return self
+
 	def isKeysOnly(self):
 		"""
 			Returns True if this query is configured as *keys only*, False otherwise.
@@ -617,92 +1677,117 @@ class Query(object):
 		self.datastoreQuery.__kind = newKind
 
 	def _runSingleFilterQuery(self, filters, amount):
+		res, self.lastCursor = self._fetchSingleFilterQuery(filters, amount, self._startCursor)
+		return res
+
+	def _getDatastoreOrders(self) -> List[Tuple[str, SortOrder]]:
+		"""
+			Returns the sort orders actually sent to the datastore.
+
+			Distinct is kinda tricky as all Fieldpaths listed in self._distinct have to be also the first sort orders.
+			We try to keep the requested order intact if possible, otherwise we'll merge / append it to the end
+		"""
+		if not self._distinct:
+			return self.orders
+		newSortOrder = []
+		postPonedOrders = {}
+		for distinctKey, sortTuple in zip_longest(self._distinct, self.orders):
+			if distinctKey and sortTuple:
+				(orderProp, orderDir) = sortTuple
+				if distinctKey == orderProp:
+					newSortOrder.append(sortTuple)
+				elif distinctKey in postPonedOrders:
+					newSortOrder.append((distinctKey, postPonedOrders[distinctKey]))
+					del postPonedOrders[distinctKey]
+				else:
+					newSortOrder.append((distinctKey, SortOrder.Ascending))
+					postPonedOrders[orderProp] = orderDir
+			elif distinctKey:
+				newSortOrder.append((distinctKey, SortOrder.Ascending))
+			elif sortTuple:
+				for k, v in postPonedOrders.items():
+					newSortOrder.append((k, v))
+				postPonedOrders = {}
+				newSortOrder.append(sortTuple)
+		for k, v in postPonedOrders.items():
+			newSortOrder.append((k, v))
+		return newSortOrder
+
+	def _fetchSingleFilterQuery(self, filters, amount, startCursor=None,
+								keysOnly: bool = False) -> Tuple[List[Union[Entity, KeyClass]], Union[None, bytes]]:
+		"""
+			Runs a query for one set of filters against the datastore.
+			Doesn't modify the state of this query object, so it's safe to call this concurrently.
+
+			:param startCursor: The cursor to start fetching from
+			:param keysOnly: If set, only the keys of the matching entities are fetched and returned
+			:returns: Tuple of the entities (or keys) fetched and the cursor pointing behind the last of these
+		"""
 		qry = __client__.query(kind=self.getKind())
+		if keysOnly or (self._projection is not None and not self._projection):
+			qry.keys_only()
+		elif self._projection and self.kind == self.origKind:
+			# If we're querying a different kind (relations), we'll fetch the whole parent entities anyway
+			qry.projection = self._projection
 		for k, v in filters.items():
 			key, op = k.split(" ")
 			qry.add_filter(key, op, v)
 		if self._distinct:
-			# Distinct is kinda tricky as all Fieldpaths listed in self._distinct have to be also the first sort orders.
-			# We try to keep the requested order intact if possible, otherwise we'll merge / append it to the end
 			qry.distinct_on = self._distinct
-			newSortOrder = []
-			postPonedOrders = {}
-			for distinctKey, sortTuple in zip_longest(self._distinct, self.orders):
-				if distinctKey and sortTuple:
-					(orderProp, orderDir) = sortTuple
-					if distinctKey == orderProp:
-						newSortOrder.append(sortTuple)
-					elif distinctKey in postPonedOrders:
-						newSortOrder.append((distinctKey, postPonedOrders[distinctKey]))
-						del postPonedOrders[distinctKey]
-					else:
-						newSortOrder.append((distinctKey, SortOrder.Ascending))
-						postPonedOrders[orderProp] = orderDir
-				elif distinctKey:
-					newSortOrder.append((distinctKey, SortOrder.Ascending))
-				elif sortTuple:
-					for k, v in postPonedOrders.items():
-						newSortOrder.append((k, v))
-					postPonedOrders = {}
-					newSortOrder.append(sortTuple)
-			for k, v in postPonedOrders.items():
-				newSortOrder.append((k, v))
+			newSortOrder = self._getDatastoreOrders()
 			if newSortOrder != self.orders:
 				logging.warning("Sortorder fixed to %s due to distinct filtering!" % newSortOrder)
-			qry.order = [x[0] if x[1] == SortOrder.Ascending else "-" + x[0] for x in newSortOrder]
 		else:
-			qry.order = [x[0] if x[1] == SortOrder.Ascending else "-" + x[0] for x in self.orders]
-		qryRes = qry.fetch(limit=amount, start_cursor=self._startCursor, end_cursor=self._endCursor)
-		res = next(qryRes.pages)
-		self.lastCursor = qryRes.next_page_token
-		return res
-
-	def _mergeMultiQueryResults(self, inputRes: List[List[Entity]]) -> List[Entity]:
+			newSortOrder = self.orders
+		qry.order = [x[0] if x[1] == SortOrder.Ascending else "-" + x[0] for x in newSortOrder]
+		qryRes = qry.fetch(limit=amount, start_cursor=startCursor, end_cursor=self._endCursor)
+		res = list(next(qryRes.pages))
+		if keysOnly:
+			res = [x.key for x in res]
+		return res, qryRes.next_page_token
+
+	def _mergeMultiQueryResults(self, inputRes: List[List[Entity]], limit: int = -1) -> List[Entity]:
 		"""
-			Merge the lists of entries into a single list; removing duplicates and restoring sort-order
-		:param inputRes: Nested Lists of Entries returned by each individual query run
-		:return: Sorted & deduplicated list of entries
+			Merge the lists of entries into a single list; removing duplicates and restoring sort-order.
+
+			As each list has already been sorted by the datastore, we just have to merge these streams
+			(instead of sorting everything again). Merging stops as soon as *limit* entries have been collected.
+			If the datastore had to sort by different orders (see :meth:`_getDatastoreOrders`), we'll sort
+			all entries again instead.
+
+			Entries that will be replaced by their parent in :meth:`_fixKind` are deduplicated by that parent.
+
+			:param inputRes: Nested Lists of Entries returned by each individual query run
+			:param limit: Maximum amount of entries to return (-1 for no limit)
+			:return: Sorted & deduplicated list of entries
 		"""
+		# Fixme: What about filters that mix different inequality filters - we'll now simply ignore any implicit sortorder
+		# The lists are only sorted by our orders if the datastore used them unchanged (distinct might alter them)
+		isPresorted = self._getDatastoreOrders() == self.orders
+		if isPresorted:
+			entries = heapq.merge(*inputRes, key=_getSortKeyFunc(self.orders))
+		else:
+			entries = chain(*inputRes)
 		seenKeys = set()
 		res = []
-		for subList in inputRes:
-			for entry in subList:
-				key = entry.key
-				if key in seenKeys:
-					continue
-				seenKeys.add(key)
-				res.append(entry)
-		# Fixme: What about filters that mix different inequality filters - we'll now simply ignore any implicit sortorder
-		return self._resortResult(res, {}, self.orders)
+		for entry in entries:
+			key = entry.key
+			if key.kind != self.origKind and key.parent and key.parent.kind == self.origKind:
+				key = key.parent
+			if key in seenKeys:
+				continue
+			seenKeys.add(key)
+			res.append(entry)
+			if isPresorted and len(res) == limit:
+				break
+		if not isPresorted:
+			res = self._resortResult(res, {}, self.orders)
+			if limit != -1:
+				res = res[:limit]
+		return res
 
 	def _resortResult(self, entities: List[Entity], filters: Dict[str, DATASTORE_BASE_TYPES],
 					  orders: List[Tuple[str, SortOrder]]) -> List[Entity]:
-
-		def getVal(src: Entity, fieldVars: Union[str, Tuple[str]], direction: SortOrder) -> Any:
-			# Descent into the target until we reach the property we're looking for
-			if isinstance(fieldVars, tuple):
-				for fv in fieldVars:
-					if not fv in src:
-						return None
-					src = src[fv]
-			else:
-				if not fieldVars in src:
-					return (str(type(None)), 0)
-				src = src[fieldVars]
-			# Lists are handled differently, here the smallest or largest value determines it's position in the result
-			if isinstance(src, list) and len(src):
-				try:
-					src.sort()
-				except TypeError:
-					# It's a list of dicts or the like for which no useful sort-order is specified
-					pass
-				if direction == SortOrder.Ascending:
-					src = src[0]
-				else:
-					src = src[-1]
-			# We must return this tuple because inter-type comparison isn't possible in Python3 anymore
-			return str(type(src)), src if src is not None else 0
-
 		# Check if we have an inequality filter which implies an sortorder
 		ineqFilter = None
 		for k, _ in filters.items():
@@ -712,18 +1797,7 @@ class Query(object):
 				break
 		if ineqFilter and (not orders or not orders[0][0] == ineqFilter):
 			orders = [(ineqFilter, SortOrder.Ascending)] + (orders or [])
-
-		for orderField, direction in orders[::-1]:
-			if orderField == KEY_SPECIAL_PROPERTY:
-				pass  # FIXME !!
-			# entities.sort(key=lambda x: x.key, reverse=direction == SortOrder.Descending)
-			else:
-				try:
-					entities.sort(key=partial(getVal, fieldVars=orderField, direction=direction),
-								  reverse=direction == SortOrder.Descending)
-				except TypeError:
-					# We hit some incomparable types
-					pass
+		entities.sort(key=_getSortKeyFunc(orders))
 		return entities
 
 	def _fixKind(self, resultList):
@@ -764,6 +1838,21 @@ class Query(object):
 			return None
 		origLimit = limit if limit != -1 else self.amount
 		qryLimit = origLimit
+		cacheKey = queryCache.getCacheKey(self, origLimit)
+		if cacheKey:
+			cacheKinds = (self.kind, self.origKind) if self.kind != self.origKind else (self.kind,)
+			cacheEntry = queryCache.get(cacheKey, cacheKinds)
+			if cacheEntry is not None:
+				res, self.lastCursor = cacheEntry
+				if conf["viur.debug.traceQueries"]:
+					logging.debug("Served query for %s with filter %s and orders %s from cache. Returned %s results"
+								  % (self.origKind, self.filters, self.orders, len(res)))
+				if res:
+					self._lastEntry = res[-1]
+				return res
+			cacheGenerations = queryCache.getGenerations(cacheKinds)
+		recordShape = conf["viur.db.recordQueryShapes"] and not self._fulltextQueryString
+		startTime = ttime()
 
 		if self._fulltextQueryString:
 			if IsInTransaction():
@@ -781,20 +1870,16 @@ class Query(object):
 			# We have more than one query to run
 			if self._calculateInternalMultiQueryAmount:
 				qryLimit = self._calculateInternalMultiQueryAmount(self, qryLimit)
-			res = []
-			# We run all queries first (preventing multiple round-trips to the server)
-			for singleFilter in self.filters:
-				res.append(self._runSingleFilterQuery(
-					filters=singleFilter,
-					amount=qryLimit))
-			# Wait for the actual results to arrive and convert the protobuffs to Entries
-			res = [self._fixKind(x) for x in res]
+			# We run all queries concurrently, so we'll only have to wait for the slowest one
+			res = _runConcurrently(partial(self._fetchSingleFilterQuery, amount=qryLimit, startCursor=self._startCursor), self.filters)
+			self.lastCursor = res[-1][1]
+			res = [x[0] for x in res]
 			if self._customMultiQueryMerge:
 				# We have a custom merge function, use that
-				res = self._customMultiQueryMerge(self, res, origLimit)
+				res = self._customMultiQueryMerge(self, [self._fixKind(x) for x in res], origLimit)
 			else:
 				# We must merge (and sort) the results ourself
-				res = self._mergeMultiQueryResults(res)
+				res = self._fixKind(self._mergeMultiQueryResults(res, origLimit))
 		else:  # We have just one single query
 			res = self._fixKind(self._runSingleFilterQuery(self.filters, qryLimit))
 		if conf["viur.debug.traceQueries"]:
@@ -805,11 +1890,15 @@ class Query(object):
 				logging.debug("Queried %s via %s with filter %s and orders %s%s. Returned %s results" % (self.origKind, self.kind, filters, orders, distinctOn, len(res)))
 			else:
 				logging.debug("Queried %s with filter %s and orders %s%s. Returned %s results" % (self.kind, filters, orders, distinctOn, len(res)))
+		if recordShape:
+			queryShapeRecorder.record(self, ttime() - startTime, len(res))
+		if cacheKey:
+			queryCache.set(cacheKey, cacheKinds, cacheGenerations, res, self.lastCursor)
 		if res:
 			self._lastEntry = res[-1]
 		return res
 
-	def fetch(self, limit=-1, **kwargs):
+	def fetch(self, limit=-1, projection: Union[None, bool, List[str]] = None, **kwargs):
 		"""
 			Run this query and fetch results as :class:`server.skeleton.SkelList`.
 
@@ -824,6 +1913,7 @@ class Query(object):
 			:param limit: Limits the query to the defined maximum entities. \
 			A maxiumum value of 99 entries can be fetched at once.
 			:type limit: int
+			:param projection: If given, only load these bones. See :func:`setProjection`.
 
 			:raises: :exc:`BadFilterError` if a filter string is invalid
 			:raises: :exc:`BadValueError` if a filter value is invalid.
@@ -836,18 +1926,38 @@ class Query(object):
 		if amount < 1 or amount > 100:
 			raise NotImplementedError(
 				"This query is not limited! You must specify an upper bound using limit() between 1 and 100")
+		if projection is not None:
+			self.setProjection(projection)
 		dbRes = self.run(amount)
 		if dbRes is None:
 			return None
 		res = SkelListRef(self.srcSkel)
+		boneMap = self.srcSkel.boneMap
+		if self._projectedBones is not None:
+			boneMap = {k: v for k, v in boneMap.items() if k in self._projectedBones or k == "key"}
 		for e in dbRes:
-			skelInstance = SkeletonInstanceRef(self.srcSkel.skeletonCls, clonedBoneMap=self.srcSkel.boneMap)
+			skelInstance = SkeletonInstanceRef(self.srcSkel.skeletonCls, clonedBoneMap=boneMap)
 			skelInstance.dbEntity = e
+			if self._projectedBones is not None:
+				skelInstance.projection = frozenset(boneMap.keys())
 			res.append(skelInstance)
+		res.unserializeAll()
 		res.getCursor = lambda: self.getCursor()
 		return res
 
-	def iter(self, keysOnly=False):
+	async def runAsync(self, limit=-1, **kwargs):
+		"""
+			Awaitable version of :func:`run`.
+		"""
+		return await _runAsync(self.run, limit, **kwargs)
+
+	async def fetchAsync(self, limit=-1, **kwargs):
+		"""
+			Awaitable version of :func:`fetch`.
+		"""
+		return await _runAsync(self.fetch, limit, **kwargs)
+
+	def iter(self, keysOnly: bool = False, batchSize: int = 100, prefetch: bool = True, pages: bool = False):
 		"""
 			Run this query and return an iterator for the results.
 
@@ -855,6 +1965,10 @@ class Query(object):
 			over a large result-set, as it hasn't have to be pulled in advance
 			from the data store.
 
+			The results are fetched in batches of *batchSize* entities. While the caller is processing one
+			batch, the next one is already fetched in the background (unless *prefetch* is disabled or we're
+			inside a transaction).
+
 			The disadvantage is, that is supports no caching yet.
 
 			This function intentionally ignores a limit set by :func:`server.db.Query.limit`.
@@ -863,19 +1977,38 @@ class Query(object):
 			Otherwise, it might not return all results as the AppEngine doesn't maintain the view \
 			for a query for more than ~30 seconds.
 
-			:param keysOnly: If the query should be used to retrieve entity keys only.
+			:param keysOnly: If the query should be used to retrieve entity keys only. If set, keys \
+				are yielded instead of entities.
 			:type keysOnly: bool
+			:param batchSize: How many entities to fetch from the datastore per round-trip
+			:type batchSize: int
+			:param prefetch: If set, fetch the next batch in the background while the current one is processed
+			:type prefetch: bool
+			:param pages: If set, whole batches (lists of entities or keys) are yielded instead of single \
+				entities. These can be passed directly to :func:`Put` or :func:`Delete`.
+			:type pages: bool
 		"""
 		if self.filters is None:  # Noting to pull here
-			raise StopIteration()
+			return
 		elif isinstance(self.filters, list):
 			raise ValueError("No iter on Multiqueries")
+		assert batchSize > 0, "batchSize must be a positive integer"
+		fetchPage = partial(self._fetchSingleFilterQuery, self.filters, batchSize, keysOnly=keysOnly)
+		res, self.lastCursor = fetchPage(self._startCursor)
 		while True:
-			qryRes = self._runSingleFilterQuery(self.filters, 20)
-			yield from qryRes
-			if not self.lastCursor:  # We reached the end of that query
-				break
 			self._startCursor = self.lastCursor
+			nextPage = None
+			if self.lastCursor and res:
+				# There might be more results; start fetching these while the caller processes this batch
+				nextPage = _runInBackground(fetchPage, self.lastCursor) if prefetch else None
+			if pages:
+				if res:
+					yield res
+			else:
+				yield from res
+			if not self.lastCursor or not res:  # We reached the end of that query
+				break
+			res, self.lastCursor = nextPage.result() if nextPage else fetchPage(self.lastCursor)
 
 	def getEntry(self) -> Union[None, Entity]:
 		"""
@@ -935,12 +2068,43 @@ class Query(object):
 		res.origKind = self.origKind
 		res._fulltextQueryString = self._fulltextQueryString
 		res._distinct = self._distinct
+		res._projection = self._projection
+		res._projectedBones = self._projectedBones
 		return res
 
 	def __repr__(self):
 		return "<db.Query on %s with filters %s and orders %s>" % (self.kind, self.filters, self.orders)
 
 
+def getKeyRangeSplitPoints(kind: str, shardCount: int, samplesPerShard: int = 32) -> List[KeyClass]:
+	"""
+		Splits the given kind into up to *shardCount* key-ranges of roughly the same size.
+
+		The split points are derived from a random sample of keys drawn using the datastore's
+		__scatter__ property, so this needs just one (keys-only) query regardless of the size of that kind.
+
+		:param kind: The kind to split
+		:param shardCount: The amount of key-ranges requested
+		:param samplesPerShard: How many keys to sample per requested range. Higher values lead to \
+			more even ranges.
+		:returns: Ordered list of (at most shardCount - 1) keys. The first range ends before the first key, \
+			the last range starts at the last key. Small kinds might yield fewer (or no) split points.
+	"""
+	if shardCount < 2:
+		return []
+	qry = Query(kind)
+	qry.orders = [("__scatter__", SortOrder.Ascending)]
+	sampleSize = min(shardCount * samplesPerShard, MAX_GET_MULTI_SIZE)
+	sample = next(qry.iter(keysOnly=True, batchSize=sampleSize, prefetch=False, pages=True), [])
+	sample.sort(key=_keySortValue)
+	res = []
+	for idx in range(1, shardCount):
+		splitPoint = sample[(idx * len(sample)) // shardCount] if sample else None
+		if splitPoint is not None and (not res or res[-1] != splitPoint):
+			res.append(splitPoint)
+	return res
+
+
 def IsInTransaction():
 	return __client__.current_transaction is not None
 
@@ -963,12 +2127,123 @@ def acquireTransactionSuccessMarker() -> str:
 	return marker
 
 
-def RunInTransaction(callee, *args, **kwargs):
-	with __client__.transaction():
-		res = callee(*args, **kwargs)
+__transactionStats__: Dict[str, Dict[str, Union[int, float]]] = {}
+__transactionHotKeys__: Dict[KeyClass, int] = {}
+__transactionStatsLock__ = threading.Lock()
+
+
+def _recordTransactionAttempt(txn, duration: float, conflict: bool) -> Set[str]:
+	"""
+		Updates the contention counters of all kinds (and on conflict, keys) touched by the given transaction.
+
+		:returns: The kinds touched by that transaction
+	"""
+	keys = set(getattr(txn, "viurReadKeys", ())) | set(getattr(txn, "viurWrittenKeys", ()))
+	kinds = {x.kind for x in keys}
+	with __transactionStatsLock__:
+		for kind in kinds:
+			stats = __transactionStats__.setdefault(kind, {"attempts": 0, "conflicts": 0, "duration": 0.0})
+			stats["attempts"] += 1
+			stats["duration"] += duration
+			if conflict:
+				stats["conflicts"] += 1
+		if conflict:
+			for key in keys:
+				__transactionHotKeys__[key] = __transactionHotKeys__.get(key, 0) + 1
+			maxHotKeys = conf["viur.db.transactionStats.maxHotKeys"]
+			if len(__transactionHotKeys__) > maxHotKeys:
+				# Forget the keys which had the fewest conflicts
+				for key, _ in sorted(__transactionHotKeys__.items(), key=lambda x: x[1])[:-maxHotKeys]:
+					del __transactionHotKeys__[key]
+	return kinds
+
+
+def getTransactionStats() -> Dict[str, Any]:
+	"""
+		Returns the contention counters (attempts, conflicts and seconds spent inside transactions) per kind
+		and the keys involved in the most conflicts on this instance.
+	"""
+	with __transactionStatsLock__:
+		return {
+			"kinds": {k: v.copy() for k, v in __transactionStats__.items()},
+			"hotKeys": sorted(__transactionHotKeys__.items(), key=lambda x: x[1], reverse=True),
+		}
+
+
+def onTransactionCommit(callback: Callable[[], Any]) -> None:
+	"""
+		Registers a callback to run once the current transaction committed successfully.
+
+		As :func:`RunInTransaction` might run its callee several times, side effects (sending emails,
+		updating external systems, ..) should be deferred using this function; callbacks registered
+		by attempts that failed are discarded. Outside transactions, the callback is run immediately.
+	"""
+	txn = __client__.current_transaction
+	if txn is None:
+		callback()
+		return
+	if not "viurCommitCallbacks" in dir(txn):
+		txn.viurCommitCallbacks = []
+	txn.viurCommitCallbacks.append(callback)
+
+
+def RunInTransaction(callee, *args, _retries: Union[None, int] = None, **kwargs):
+	"""
+		Runs *callee* inside a transaction and returns its result.
+
+		If the transaction fails due to contention, it's retried up to *_retries* (default
+		conf["viur.db.transactionRetries"]) times, waiting a jittered, exponentially growing delay
+		in between. The callee must therefore be idempotent; use :func:`onTransactionCommit` for side
+		effects that must happen only once. Pass _retries=0 for callees that can't be retried.
+
+		Each attempt is recorded in the per-kind contention counters (see :func:`getTransactionStats`)
+		and reported to conf["viur.db.transactionMetricsHook"] if set.
+	"""
+	requestWriteBuffer = _currentWriteBuffer.get()
+	if requestWriteBuffer is not None:
+		# Ensure the transaction sees everything written so far
+		requestWriteBuffer.flush()
+	if _retries is None:
+		_retries = conf["viur.db.transactionRetries"]
+	attempt = 0
+	while True:
+		startTime = ttime()
+		txn = None
+		try:
+			with __client__.transaction() as txn:
+				txn.viurWriteBuffer = WriteBuffer()
+				res = callee(*args, **kwargs)
+				# Send all mutations collected along with the commit
+				txn.viurWriteBuffer.flush()
+		except Conflict:
+			duration = ttime() - startTime
+			kinds = _recordTransactionAttempt(txn, duration, True)
+			retry = attempt < _retries
+			if conf["viur.db.transactionMetricsHook"]:
+				conf["viur.db.transactionMetricsHook"](kinds, attempt, duration, False, retry)
+			if not retry:
+				raise
+			delay = min(conf["viur.db.transactionRetryMaxDelay"],
+						conf["viur.db.transactionRetryBaseDelay"] * 2 ** attempt)
+			attempt += 1
+			logging.warning("Transaction running %s failed due to contention, retrying (%s of %s)" % (
+				getattr(callee, "__qualname__", callee), attempt, _retries))
+			sleep(random.uniform(0, delay))
+			continue
+		break
+	duration = ttime() - startTime
+	kinds = _recordTransactionAttempt(txn, duration, False)
+	if conf["viur.db.transactionMetricsHook"]:
+		conf["viur.db.transactionMetricsHook"](kinds, attempt, duration, True, False)
+	if "viurWrittenKeys" in dir(txn):
+		# Another request of this instance might have cached the old version while we were running
+		entityCache.invalidate(list(txn.viurWrittenKeys))
+		queryCache.invalidateKinds({x.kind for x in txn.viurWrittenKeys})
+	for callback in getattr(txn, "viurCommitCallbacks", ()):
+		callback()
 	return res
 
 
-__all__ = [KEY_SPECIAL_PROPERTY, DATASTORE_BASE_TYPES, SortOrder, Entity, Key, KeyClass, Put, Get, Delete, AllocateIds,
-		   Conflict, Error, keyHelper, fixUnindexableProperties, GetOrInsert, Query, IsInTransaction,
-		   acquireTransactionSuccessMarker, RunInTransaction]
+__all__ = [KEY_SPECIAL_PROPERTY, DATASTORE_BASE_TYPES, SortOrder, Entity, Key, KeyClass, Put, Get, GetMulti, Delete, AllocateIds,
+		   Conflict, Error, keyHelper, fixUnindexableProperties, GetOrInsert, Query, IsInTransaction, GetAsync, GetMultiAsync, PutAsync, DeleteAsync,
+		   acquireTransactionSuccessMarker, RunInTransaction, getTransactionStats, onTransactionCommit, getKeyRangeSplitPoints, getIdentityMapStats, queueFetch, fetchQueued, entityCache, queryCache, queryShapeRecorder, bufferWrites]
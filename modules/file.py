@@ -456,26 +456,27 @@ def doCleanupDeletedFiles(cursor=None):
 	query = db.Query("viur-deleted-files")
 	if cursor:
 		query.setCursor(cursor)
-	for file in query.run(100):
-		if not "dlkey" in file:
-			db.Delete(file.key)
-		elif db.Query("viur-blob-locks").filter("active_blob_references =", file["dlkey"]).getEntry():
-			logging.info("is referenced, %s" % file["dlkey"])
-			db.Delete(file.key)
-		else:
-			if file["itercount"] > maxIterCount:
-				logging.info("Finally deleting, %s" % file["dlkey"])
-				blobs = bucket.list_blobs(prefix="%s/" % file["dlkey"])
-				for blob in blobs:
-					blob.delete()
+	with db.bufferWrites():  # Send the updated counters and deletions of this batch in one go
+		for file in query.run(100):
+			if not "dlkey" in file:
+				db.Delete(file.key)
+			elif db.Query("viur-blob-locks").filter("active_blob_references =", file["dlkey"]).getEntry():
+				logging.info("is referenced, %s" % file["dlkey"])
 				db.Delete(file.key)
-				# There should be exactly 1 or 0 of these
-				for f in skeletonByKind("file")().all().filter("dlkey =", file["dlkey"]).fetch(99):
-					f.delete()
 			else:
-				logging.debug("Increasing count, %s" % file["dlkey"])
-				file["itercount"] += 1
-				db.Put(file)
+				if file["itercount"] > maxIterCount:
+					logging.info("Finally deleting, %s" % file["dlkey"])
+					blobs = bucket.list_blobs(prefix="%s/" % file["dlkey"])
+					for blob in blobs:
+						blob.delete()
+					db.Delete(file.key)
+					# There should be exactly 1 or 0 of these
+					for f in skeletonByKind("file")().all().filter("dlkey =", file["dlkey"]).fetch(99):
+						f.delete()
+				else:
+					logging.debug("Increasing count, %s" % file["dlkey"])
+					file["itercount"] += 1
+					db.Put(file)
 	newCursor = query.getCursor()
 	if newCursor:
 		doCleanupDeletedFiles(newCursor)
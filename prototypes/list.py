@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from viur.core import utils, errors, conf, securitykey
 from viur.core import forcePost, forceSSL, exposed, internalExposed
-from viur.core.skeleton import Skeleton
+from viur.core.skeleton import Skeleton, resolveSeoKey
 from viur.core.prototypes import BasicApplication
 from time import time as ttime
 from viur.core.utils import currentRequest
@@ -300,9 +300,9 @@ class List(BasicApplication):
 		"""
 		if args and args[0]:
 			# We probably have a Database or SEO-Key here
-			seoKey = "viurActiveSeoKeys ="
-			skel = self.viewSkel().all().filter(seoKey, args[0]).getSkel()
-			if skel:
+			skel = self.viewSkel()
+			dbKey = resolveSeoKey(skel.kindName, args[0])
+			if skel.fromDB(dbKey or args[0]):
 				if not self.canView(skel):
 					raise errors.Forbidden()
 				self.onViewed(skel)
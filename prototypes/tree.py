@@ -196,18 +196,18 @@ class Tree(BasicApplication):
 			db.Put(node)
 
 		# Fix all nodes
-		for repo in db.Query(self.viewSkel(TreeType.Node).kindName) \
+		for repoKey in db.Query(self.viewSkel(TreeType.Node).kindName) \
 				.filter("parententry =", parentNode) \
-				.iter(keysOnly=True):  # fixme KeysOnly not working
-			self.updateParentRepo(repo.key, newRepoKey, depth=depth + 1)
-			db.RunInTransaction(fixTxn, repo.key, newRepoKey)
+				.iter(keysOnly=True):
+			self.updateParentRepo(repoKey, newRepoKey, depth=depth + 1)
+			db.RunInTransaction(fixTxn, repoKey, newRepoKey)
 
 		# Fix the leafs on this level
 		if self.leafSkelCls:
-			for repo in db.Query(self.viewSkel(TreeType.Leaf).kindName) \
+			for repoKey in db.Query(self.viewSkel(TreeType.Leaf).kindName) \
 					.filter("parententry =", parentNode) \
 					.iter(keysOnly=True):
-				db.RunInTransaction(fixTxn, repo.key, newRepoKey)
+				db.RunInTransaction(fixTxn, repoKey, newRepoKey)
 
 	## External exposed functions
 
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from . import utils as jinjaUtils
-from .wrap import ListWrapper, SkelListWrapper
+from .wrap import LazySkelData, ListWrapper, SkelListWrapper
 
 from viur.core import utils, request, errors, securitykey, db
 from viur.core.skeleton import SkeletonInstance, RefSkel, skeletonByKind, SkeletonInstance
@@ -292,6 +292,25 @@ class Render(object):
 			return boneValue
 		return None
 
+	def queueReferencedEntries(self, skellist):
+		"""
+			Queues the entries referenced by the relational bones of the given skeletons with
+			:func:`server.db.queueFetch`. If the template fetches them (eg. by calling getSkel for each row),
+			they're loaded with one batch on the first call instead of one by one.
+
+			:param skellist: List of skeletons which will be rendered.
+			:type skellist: list
+		"""
+		keys = []
+		for skel in skellist:
+			if not isinstance(skel, SkeletonInstance):
+				continue
+			for key, bone in skel.items():
+				if isinstance(bone, relationalBone):
+					keys.extend(bone.getReferencedKeys(skel, key, ignoreUpdateLevel=True))
+		if keys:
+			db.queueFetch(keys)
+
 	def collectSkelData(self, skel):
 		"""
 			Prepares values of one :class:`server.db.skeleton.Skeleton` or a list of skeletons for output.
@@ -304,6 +323,7 @@ class Render(object):
 		"""
 		# logging.error("collectSkelData %s", skel)
 		if isinstance(skel, list):
+			self.queueReferencedEntries(skel)
 			return [self.collectSkelData(x) for x in skel]
 		res = {}
 		for key, bone in skel.items():
@@ -503,6 +523,7 @@ class Render(object):
 		#	resList.append(self.collectSkelData(skel))
 		for skel in skellist:
 			skel.renderPreparation = self.renderBoneValue
+		self.queueReferencedEntries(skellist)
 		return template.render(skellist=skellist, params=params, **kwargs)  # SkelListWrapper(resList, skellist)
 
 	def listRootNodes(self, repos, tpl=None, params=None, **kwargs):
@@ -831,6 +852,9 @@ class Render(object):
 			loaders = self.getLoaders()
 			self.env = Environment(loader=loaders, extensions=["jinja2.ext.do", "jinja2.ext.loopcontrols", TranslationExtension])
 			self.env.trCache = {}
+			# Allow |tojson to serialize the (lazily loaded) results of getSkel
+			self.env.policies["json.dumps_kwargs"] = dict(self.env.policies["json.dumps_kwargs"],
+														   default=LazySkelData.jsonDefault)
 
 			# Import functions.
 			for name, func in jinjaUtils.getGlobalFunctions().items():
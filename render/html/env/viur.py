@@ -8,11 +8,13 @@ from collections import OrderedDict
 # from google.appengine.ext import db
 # from google.appengine.api import memcache, users
 from datetime import timedelta
+from functools import partial
 from hashlib import sha512
 from typing import Dict, List, Union
 
 from viur.core import conf, db, errors, prototypes, securitykey, utils
 from viur.core.render.html.utils import jinjaGlobalFilter, jinjaGlobalFunction
+from viur.core.render.html.wrap import LazySkelData
 from viur.core.skeleton import RelSkel, SkeletonInstance
 from viur.core.utils import currentLanguage, currentRequest
 
@@ -123,6 +125,9 @@ def getSkel(render, module, key=None, skel="viewSkel"):
 	It is possible to specify a different data-model as the one used for rendering
 	(e.g. an editSkel).
 
+	Entries queued in this request (like the ones referenced by a rendered list) are fetched
+	together with the requested one, so further calls are served from memory.
+
 	:param module: Name of the module, from which the data should be fetched.
 	:type module: str
 
@@ -136,6 +141,44 @@ def getSkel(render, module, key=None, skel="viewSkel"):
 	:returns: dict on success, False on error.
 	:rtype: dict | bool
 	"""
+	loader = _getSkelLoader(module, key, skel)
+	if not loader:
+		return loader
+	return loader(render)
+
+
+@jinjaGlobalFunction
+def getSkelLazy(render, module, key=None, skel="viewSkel"):
+	"""
+	Jinja2 global: Like :func:`getSkel`, but unless that entry has already been fetched in
+	this request, a :class:`LazySkelData` proxy is returned, which loads the entry when it's
+	accessed for the first time. Until then, entries requested by further calls are queued,
+	so they're fetched together in one batch.
+
+	The proxy behaves like the dict (or None if that entry is missing or can't be viewed) it
+	resolves to, and |tojson serializes that value. As the proxy itself is never none, test for
+	missing entries with ``{% if not skel %}`` instead of ``{% if skel is none %}``.
+
+	:returns: dict or LazySkelData on success, False on error.
+	:rtype: dict | LazySkelData | bool
+	"""
+	loader = _getSkelLoader(module, key, skel)
+	if not loader:
+		return loader
+	try:
+		isQueued = db.queueFetch([db.keyHelper(loader.keywords["key"], loader.keywords["skel"].kindName)])
+	except ValueError:  # Not an entry of that kind (eg. a tree's rootNode)
+		isQueued = False
+	if not isQueued:  # Nothing to gain from waiting, we can tell the result right now
+		return loader(render)
+	return LazySkelData(partial(loader, render))
+
+
+def _getSkelLoader(module, key, skel):
+	"""
+		Runs the cheap checks of getSkel and returns a function loading the requested entry
+		(or False if that entry can't be fetched).
+	"""
 	if module not in dir(conf["viur.mainApp"]):
 		logging.error("getSkel called with unknown module %s!" % module)
 		return False
@@ -155,43 +198,51 @@ def getSkel(render, module, key=None, skel="viewSkel"):
 		if not isinstance(skel, SkeletonInstance):
 			return False
 
-		if "canView" in dir(obj):
-			if not skel.fromDB(key):
-				logging.info("getSkel: Entry %s not found" % (key,))
-				return None
-			if isinstance(obj, prototypes.singleton.Singleton):
-				isAllowed = obj.canView()
-			elif isinstance(obj, prototypes.tree.Tree):
-				k = db.Key(key)
-				if k.kind().endswith("_rootNode"):
-					isAllowed = obj.canView("node", skel)
-				else:
-					isAllowed = obj.canView("leaf", skel)
-			else:  # List and Hierarchies
-				isAllowed = obj.canView(skel)
-			if not isAllowed:
-				logging.error("getSkel: Access to %s denied from canView" % (key,))
-				return None
-		elif "listFilter" in dir(obj):
-			qry = skel.all().mergeExternalFilter({"key": str(key)})
-			qry = obj.listFilter(qry)
-			if not qry:
-				logging.info("listFilter permits getting entry, returning None")
-				return None
-
-			skel = qry.getSkel()
-			if not skel:
-				return None
-
-		else:  # No Access-Test for this module
-			if not skel.fromDB(key):
-				return None
-
-		return render.collectSkelData(skel)
+		return partial(_loadSkel, obj=obj, skel=skel, key=key)
 
 	return False
 
 
+def _loadSkel(render, obj, skel, key):
+	"""
+		Loads the entry requested by getSkel, including all entries queued in this request.
+	"""
+	db.fetchQueued()
+	if "canView" in dir(obj):
+		if not skel.fromDB(key):
+			logging.info("getSkel: Entry %s not found" % (key,))
+			return None
+		if isinstance(obj, prototypes.singleton.Singleton):
+			isAllowed = obj.canView()
+		elif isinstance(obj, prototypes.tree.Tree):
+			k = db.Key(key)
+			if k.kind().endswith("_rootNode"):
+				isAllowed = obj.canView("node", skel)
+			else:
+				isAllowed = obj.canView("leaf", skel)
+		else:  # List and Hierarchies
+			isAllowed = obj.canView(skel)
+		if not isAllowed:
+			logging.error("getSkel: Access to %s denied from canView" % (key,))
+			return None
+	elif "listFilter" in dir(obj):
+		qry = skel.all().mergeExternalFilter({"key": str(key)})
+		qry = obj.listFilter(qry)
+		if not qry:
+			logging.info("listFilter permits getting entry, returning None")
+			return None
+
+		skel = qry.getSkel()
+		if not skel:
+			return None
+
+	else:  # No Access-Test for this module
+		if not skel.fromDB(key):
+			return None
+
+	return render.collectSkelData(skel)
+
+
 @jinjaGlobalFunction
 def getHostUrl(render, forceSSL=False, *args, **kwargs):
 	"""
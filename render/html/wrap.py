@@ -52,3 +52,67 @@ class SkelListWrapper(ListWrapper):
 		else:
 			self.getCursor = src.getCursor
 			self.customQueryInfo = src.customQueryInfo
+
+
+class LazySkelData(object):
+	"""
+		Placeholder for the result of a function that loads an entry (like the getSkelLazy jinja-function).
+		The entry is loaded on first access, so that the entries requested by several calls can be
+		fetched with one batch. Behaves like the result (usually a dict) afterwards.
+	"""
+	__slots__ = ("_loader", "_value")
+	_notLoaded = object()
+
+	def __init__(self, loader):
+		self._loader = loader
+		self._value = LazySkelData._notLoaded
+
+	def _resolve(self):
+		if self._value is LazySkelData._notLoaded:
+			self._value = self._loader()
+			self._loader = None
+		return self._value
+
+	def __getattr__(self, item):
+		return getattr(self._resolve(), item)
+
+	def __getitem__(self, item):
+		return self._resolve()[item]
+
+	def __contains__(self, item):
+		return item in self._resolve()
+
+	def __iter__(self):
+		return iter(self._resolve())
+
+	def __len__(self):
+		return len(self._resolve())
+
+	def __bool__(self):
+		return bool(self._resolve())
+
+	def __eq__(self, other):
+		if isinstance(other, LazySkelData):
+			other = other._resolve()
+		return self._resolve() == other
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __str__(self):
+		return str(self._resolve())
+
+	def __repr__(self):
+		return repr(self._resolve())
+
+	@staticmethod
+	def jsonDefault(obj):
+		"""
+			Serializes LazySkelData proxies as the value they resolve to; used as default for json.dumps
+			(eg. by the |tojson filter).
+		"""
+		if isinstance(obj, LazySkelData):
+			return obj._resolve()
+		raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
@@ -88,6 +88,9 @@ class BrowseHandler():  # webapp.RequestHandler
 		self.response = response
 		self.maxLogLevel = logging.DEBUG
 		self._traceID = request.headers.get('X-Cloud-Trace-Context') or utils.generateRandomString()
+		self.dbIdentityMap = {}  # Entities fetched by db.Get during this request
+		self.dbIdentityMapStats = {"hits": 0, "misses": 0}
+		self.dbFetchQueue = set()  # Keys queued by db.queueFetch, fetched together by db.fetchQueued
 
 	def selectLanguage(self, path: str):
 		"""
@@ -267,6 +270,9 @@ class BrowseHandler():  # webapp.RequestHandler
 			self.response.write(res.encode("UTF-8"))
 		finally:
 			self.saveSession()
+			if conf["viur.debug.traceQueries"]:
+				logging.debug("Identity map served %(hits)s entities from memory, %(misses)s from the datastore"
+							  % self.dbIdentityMapStats)
 
 			return 0 #Disabled GAE logging
 
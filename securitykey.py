@@ -88,8 +88,7 @@ def startClearSKeys():
 @callDeferred
 def doClearSKeys(timeStamp, cursor):
 	query = db.Query(securityKeyKindName).filter("until <", datetime.strptime(timeStamp, "%d.%m.%Y %H:%M:%S"))
-	for oldKey in query.run(100, keysOnly=True):
-		db.Delete(oldKey)
+	db.Delete(query.run(100, keysOnly=True) or [])
 	newCursor = query.getCursor()
 	if newCursor:
 		doClearSKeys(timeStamp, newCursor)
@@ -231,8 +231,8 @@ def killSessionByUser(user=None):
 	query = db.Query(GaeSession.kindName)
 	if user is not None:
 		query.filter("user =", str(user))
-	for key in query.iter(keysOnly=True):
-		db.Delete(key)
+	for keys in query.iter(keysOnly=True, batchSize=db.MAX_DELETE_MULTI_SIZE, pages=True):
+		db.Delete(keys)
 
 
 @PeriodicTask(60 * 4)
@@ -246,8 +246,10 @@ def startClearSessions():
 @callDeferred
 def doClearSessions(timeStamp, cursor):
 	query = db.Query(GaeSession.kindName).filter("lastseen <", timeStamp)
-	for oldKey in query.run(100, keysOnly=True):
-		db.Delete(oldKey)
-	newCursor = query.getCursor()
-	if newCursor:
-		doClearSessions(timeStamp, newCursor)
+	for pageCount, keys in enumerate(query.iter(keysOnly=True, batchSize=db.MAX_DELETE_MULTI_SIZE, pages=True)):
+		db.Delete(keys)
+		if pageCount >= 9:
+			# Continue in a new task, so we won't exceed the deadline of this one.
+			# As we're deleting the entries, the query has to start from the beginning again
+			doClearSessions(timeStamp, None)
+			break
@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 import copy
+import datetime
+import hashlib
 import inspect
 import logging
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from functools import partial
 from itertools import chain
 from time import time
@@ -13,8 +18,9 @@ from typing import Any, Callable, Dict, Iterable, List, Tuple, Union, Set
 
 from viur.core import conf, db, errors, utils
 from viur.core.bones import baseBone, dateBone, keyBone, relationalBone, selectBone, stringBone
-from viur.core.bones.bone import ReadFromClientError, ReadFromClientErrorSeverity, getSystemInitialized
-from viur.core.tasks import CallableTask, CallableTaskBase, callDeferred
+from viur.core.bones.bone import IndexMode, ReadFromClientError, ReadFromClientErrorSeverity, getSystemInitialized
+from viur.core.tasks import CallableTask, CallableTaskBase, PeriodicTask, ShardedScanHandler, callDeferred, \
+	startShardedScan
 
 try:
 	import pytz
@@ -53,11 +59,99 @@ class MetaBaseSkel(type):
 
 		fillBoneMapRecursive(cls)
 		cls.__boneMap__ = boneMap
+		# Compile how each property has to be indexed, so serializing doesn't have to figure this out on each write
+		cls.__indexSchema__ = {key: bone.getIndexMode() for key, bone in boneMap.items()}
 		if not getSystemInitialized():
 			MetaBaseSkel._allSkelClasses.add(cls)
 		super(MetaBaseSkel, cls).__init__(name, bases, dct)
 
 
+def _exceedsIndexLimit(value) -> bool:
+	"""
+		Checks if the given value contains a string that's too long to be indexed.
+		Embedded entities are skipped - they've been built by a serialize call that already
+		applied the index schema of their skeleton.
+	"""
+	if isinstance(value, db.Entity):
+		return False
+	elif isinstance(value, (str, bytes)):
+		return len(value) >= 500
+	elif isinstance(value, dict):
+		return any(_exceedsIndexLimit(x) for x in value.values())
+	elif isinstance(value, list):
+		return any(_exceedsIndexLimit(x) for x in value)
+	return False
+
+
+def _applyIndexSchema(skel: SkeletonInstance, parentIndexed: bool) -> None:
+	"""
+		Updates the exclude_from_indexes set of skel.dbEntity in one pass over its bones,
+		using the index schema compiled for its skeleton class.
+		Bones that have been replaced on this instance (eg. by a fullClone) are evaluated again.
+
+		:param skel: The skeleton which dbEntity has just been serialized
+		:param parentIndexed: If False, this entity will be embedded into an unindexed property
+	"""
+	dbEntity = skel.dbEntity
+	indexSchema = skel.skeletonCls.__indexSchema__
+	clsBoneMap = skel.skeletonCls.__boneMap__
+	excluded = {x for x in dbEntity.exclude_from_indexes if x not in skel.boneMap}
+	for name, bone in skel.boneMap.items():
+		if clsBoneMap.get(name) is bone:
+			indexMode = indexSchema[name]
+		else:
+			indexMode = bone.getIndexMode()
+		if indexMode is IndexMode.Forced:
+			continue
+		if indexMode is IndexMode.Unindexed or not parentIndexed:
+			excluded.add(name)
+		elif indexMode is IndexMode.LengthChecked and name in dbEntity and _exceedsIndexLimit(dbEntity[name]):
+			excluded.add(name)
+	dbEntity.exclude_from_indexes = excluded
+
+
+def _compileCodec(skelCls) -> Dict[str, Tuple[baseBone, Callable, Callable]]:
+	"""
+		Compiles the serializer and unserializer of each bone of the given skeleton class.
+	"""
+	return {name: (bone, bone.compileSerializer(name), bone.compileUnserializer(name))
+			for name, bone in skelCls.__boneMap__.items()}
+
+
+def _getCodec(skelCls) -> Dict[str, Tuple[baseBone, Callable, Callable]]:
+	"""
+		Returns the codec of the given skeleton class, compiling it if it's not there yet.
+		(Classes created after setSystemInitialized and calls during startup don't have one.)
+	"""
+	codec = skelCls.__dict__.get("__codec__")
+	if codec is None:
+		codec = _compileCodec(skelCls)
+		if getSystemInitialized():  # Bones may still change until then
+			skelCls.__codec__ = codec
+	return codec
+
+
+def _getSerializer(skel: SkeletonInstance, name: str, bone: baseBone) -> Callable[[SkeletonInstance, bool], bool]:
+	"""
+		Returns the compiled serializer for the given bone. Bones that have been replaced on this
+		instance (eg. by a fullClone) are serialized by calling their serialize method.
+	"""
+	entry = _getCodec(skel.skeletonCls).get(name)
+	if entry is not None and entry[0] is bone:
+		return entry[1]
+	return lambda skel, parentIndexed: bone.serialize(skel, name, parentIndexed)
+
+
+def _getUnserializer(skel: SkeletonInstance, name: str, bone: baseBone) -> Callable[[SkeletonInstance], bool]:
+	"""
+		Returns the compiled unserializer for the given bone. See :func:`_getSerializer`.
+	"""
+	entry = _getCodec(skel.skeletonCls).get(name)
+	if entry is not None and entry[0] is bone:
+		return entry[2]
+	return lambda skel: bone.unserialize(skel, name)
+
+
 def skeletonByKind(kindName):
 	if not kindName:
 		return None
@@ -75,27 +169,177 @@ def iterAllSkelClasses():
 		yield cls
 
 
+seoKeyRegistryKindName = "viur-seo-keys"
+
+
+def getSeoKeyRegistryKey(kindName: str, language: str, seoKey: str) -> db.KeyClass:
+	"""
+		Returns the key of the entry in the SEO-Key registry claiming *seoKey* in the given language
+		for entries of *kindName*. These entries are maintained by :meth:`Skeleton.toDB`.
+	"""
+	return db.Key(seoKeyRegistryKindName, "%s/%s/%s" % (kindName, language, seoKey))
+
+
+def resolveSeoKey(kindName: str, seoKey: str, language: Union[None, str] = None) -> Union[None, db.KeyClass]:
+	"""
+		Resolves a SEO-Key of an entry of *kindName* using the SEO-Key registry.
+
+		:param kindName: The kind the entry belongs to
+		:param seoKey: The SEO-Key to resolve
+		:param language: The language to try first (defaults to the current language). SEO-Keys set in other \
+			languages are resolved as well.
+		:returns: The key of that entry or None if that SEO-Key isn't registered
+	"""
+	language = language or utils.currentLanguage.get()
+	languages = [language] + [x for x in (conf["viur.availableLanguages"] or [conf["viur.defaultLanguage"]])
+							  if x != language]
+	for registryEntry in db.GetMulti([getSeoKeyRegistryKey(kindName, x, seoKey) for x in languages]):
+		if registryEntry is not None:
+			return registryEntry["target"]
+	return _findLegacySeoKeyHolder(kindName, seoKey)
+
+
+def _findLegacySeoKeyHolder(kindName: str, seoKey: str) -> Union[None, db.KeyClass]:
+	"""
+		Returns the key of an entry of *kindName* listing *seoKey* in its viurActiveSeoKeys, if
+		conf["viur.seoKeys.legacyLookup"] is set (None otherwise).
+
+		Deprecated: This query is only needed for entries saved before the SEO-Key registry existed,
+		until the registry has been backfilled by the backfillSeoKeyRegistry task.
+	"""
+	if not conf["viur.seoKeys.legacyLookup"]:
+		return None
+	logging.warning("Looking up SEO-Key %s of %s by querying viurActiveSeoKeys. This is deprecated, run the "
+					"backfillSeoKeyRegistry task and disable viur.seoKeys.legacyLookup" % (seoKey, kindName))
+	legacyEntry = db.Query(kindName).filter("viurActiveSeoKeys =", seoKey).getEntry()
+	return legacyEntry.key if legacyEntry else None
+
+
+def _releaseSeoKeys(kindName: str, dbKey: db.KeyClass, seoKeys: List[str]) -> None:
+	"""
+		Removes the entries claimed by *dbKey* for the given SEO-Keys (in any language) from the SEO-Key
+		registry. Entries are checked and deleted in batches.
+	"""
+	registryKeys = [getSeoKeyRegistryKey(kindName, language, seoKey)
+					for language in (conf["viur.availableLanguages"] or [conf["viur.defaultLanguage"]])
+					for seoKey in seoKeys]
+	for idx in range(0, len(registryKeys), db.MAX_DELETE_MULTI_SIZE):
+		batch = registryKeys[idx: idx + db.MAX_DELETE_MULTI_SIZE]
+		claimedKeys = [k for k, v in zip(batch, db.GetMulti(batch)) if v is not None and v["target"] == dbKey]
+		if claimedKeys:
+			db.Delete(claimedKeys)
+
+
+relationsOutboxKindName = "viur-relations-outbox"
+
+
+def getRelationsOutboxKey(dbKey: db.KeyClass) -> db.KeyClass:
+	"""
+		Returns the key of the entry in the relations outbox recording pending changes of *dbKey*,
+		which have not been propagated to the entries referencing it yet.
+	"""
+	return db.Key(relationsOutboxKindName, db.encodeKey(dbKey))
+
+
+def _mergeRelationsOutboxEntry(outboxObj: Union[None, db.Entity], dbKey: db.KeyClass,
+							   changeList: List[str]) -> db.Entity:
+	"""
+		Records the changes made to *dbKey* in its (possibly already existing) outbox entry.
+		If it has been changed again before the previous changes have been propagated, both changeLists are
+		merged, so all these changes will be propagated with one call to :func:`updateRelations`.
+	"""
+	if outboxObj is None:
+		outboxObj = db.Entity(getRelationsOutboxKey(dbKey))
+		outboxObj["changeList"] = changeList
+	elif outboxObj["changeList"] is not None:
+		outboxObj["changeList"] = sorted(set(outboxObj["changeList"]) | set(changeList))
+	if outboxObj["changeList"] is not None and len(outboxObj["changeList"]) >= 30:
+		outboxObj["changeList"] = None  # Too many changes, update all relations
+	outboxObj["kind"] = dbKey.kind
+	outboxObj["dest"] = dbKey
+	outboxObj["updateTime"] = time()
+	outboxObj.exclude_from_indexes = {"kind", "dest", "changeList"}
+	return outboxObj
+
+
+class UnprojectedBoneError(Exception):
+	"""
+		Raised when accessing a bone that hasn't been loaded by the projection query
+		its skeleton has been fetched with.
+	"""
+	pass
+
+
+class _UnfingerprintableValue(Exception):
+	pass
+
+
+# Types whose repr reflects their value; anything else can't be fingerprinted reliably
+_fingerprintableTypes = (type(None), bool, int, float, str, bytes, datetime.datetime, datetime.date, datetime.time,
+						 datetime.timedelta, db.KeyClass)
+
+
+def _valueFingerprint(value) -> Union[None, str]:
+	"""
+		Returns a fingerprint of a bone's value, used to detect if it has been modified in place.
+		Only the primitive types listed in _fingerprintableTypes, containers of them and skeletons are
+		fingerprinted. For any other value (eg. an object which repr doesn't change when it's modified)
+		None is returned, and that value must be treated as modified.
+	"""
+
+	def walk(val) -> str:
+		if isinstance(val, SkeletonInstance):
+			return "S(%s|%s)" % (walk(dict(val.dbEntity or {})), walk(val.accessedValues))
+		elif isinstance(val, dict):
+			return "{%s}" % ",".join(
+				["%s:%s" % (walk(k), walk(v)) for k, v in sorted(val.items(), key=lambda x: repr(x[0]))])
+		elif isinstance(val, (list, tuple)):
+			return "[%s]" % ",".join([walk(x) for x in val])
+		elif isinstance(val, set):
+			return "<%s>" % ",".join(sorted([walk(x) for x in val]))
+		elif isinstance(val, _fingerprintableTypes):
+			return "%s:%r" % (type(val).__name__, val)
+		raise _UnfingerprintableValue()
+
+	try:
+		return hashlib.sha1(walk(value).encode("UTF-8")).hexdigest()
+	except _UnfingerprintableValue:
+		return None
+
+
+_subSkelBoneMaps = {}  # Mapping (skelCls, subSkelNames) -> boneMap
+
+
+def _getSubSkelBoneMap(skelCls, subSkelNames: Tuple[str]) -> Dict[str, baseBone]:
+	"""
+		Returns the bones of the given sub-skeletons of skelCls. The result is resolved once
+		per combination and must not be modified.
+	"""
+	cacheKey = (skelCls, subSkelNames)
+	boneMap = _subSkelBoneMaps.get(cacheKey)
+	if boneMap is None:
+		boneList = ["key"] + list(chain(*[skelCls.subSkels.get(x, []) for x in ("*",) + subSkelNames]))
+		prefixes = tuple(x[:-1] for x in boneList if x[-1] == "*")
+		boneNames = set(boneList)
+		boneMap = {k: v for k, v in skelCls.__boneMap__.items() if k in boneNames or k.startswith(prefixes)}
+		_subSkelBoneMaps[cacheKey] = boneMap
+	return boneMap
+
+
 class SkeletonInstance:
 	__slots__ = {"dbEntity", "accessedValues", "renderAccessedValues", "boneMap", "errors", "skeletonCls",
-				 "renderPreparation"}
+				 "renderPreparation", "projection", "copyOnWrite", "valueHashes"}
 
 	def __init__(self, skelCls, subSkelNames=None, fullClone=False, clonedBoneMap=None):
+		# Cloned instances share the bones with their skeleton class until one is accessed as
+		# attribute (skel.boneName) - that's the only way to modify a bone (see __getattr__).
+		# Values (skel["boneName"]) and bones read through boneMap or items() never cause a copy.
+		self.copyOnWrite = fullClone
 		if clonedBoneMap:
 			self.boneMap = clonedBoneMap
 		elif subSkelNames:
-			boneList = ["key"] + list(chain(*[skelCls.subSkels.get(x, []) for x in ["*"] + subSkelNames]))
-			doesMatch = lambda name: name in boneList or any([name.startswith(x[:-1]) for x in boneList if x[-1] == "*"])
-			if fullClone:
-				self.boneMap = {k: copy.deepcopy(v) for k, v in skelCls.__boneMap__.items() if doesMatch(k)}
-				for v in self.boneMap.values():
-					v.isClonedInstance = True
-			else:
-				self.boneMap = {k: v for k, v in skelCls.__boneMap__.items() if doesMatch(k)}
-		elif fullClone:
-			self.boneMap = copy.deepcopy(skelCls.__boneMap__)
-			for v in self.boneMap.values():
-				v.isClonedInstance = True
-		else:  # No Subskel, no Clone
+			self.boneMap = _getSubSkelBoneMap(skelCls, tuple(subSkelNames)).copy()
+		else:
 			self.boneMap = skelCls.__boneMap__.copy()
 		self.dbEntity = None
 		self.accessedValues = {}
@@ -103,6 +347,8 @@ class SkeletonInstance:
 		self.errors = []
 		self.skeletonCls = skelCls
 		self.renderPreparation = None
+		self.projection = None  # Names of the bones loaded if this has been fetched by a projection query
+		self.valueHashes = None  # Fingerprints of the values as they have been loaded (see fromDB)
 
 	def items(self) -> Iterable[Tuple[str, baseBone]]:
 		yield from self.boneMap.items()
@@ -127,6 +373,8 @@ class SkeletonInstance:
 		# elif isinstance(value, db.Key):
 		#	value = str(value[1])
 		self.accessedValues[key] = value
+		if self.valueHashes:
+			self.valueHashes.pop(key, None)  # This bone has been changed
 
 	def __getitem__(self, key):
 		if self.renderPreparation:
@@ -134,27 +382,50 @@ class SkeletonInstance:
 				return self.renderAccessedValues[key]
 		if key not in self.accessedValues:
 			boneInstance = self.boneMap.get(key, None)
+			if boneInstance is None and self.projection is not None and key in self.skeletonCls.__boneMap__:
+				raise UnprojectedBoneError("Bone %s of %s has not been loaded by the projection %s" % (
+					key, self.skeletonCls.__name__, sorted(self.projection)))
 			if boneInstance:
 				if self.dbEntity is not None:
-					boneInstance.unserialize(self, key)
+					_getUnserializer(self, key, boneInstance)(self)
+					if self.valueHashes is not None:
+						# Remember how that value looked like, so toDB can tell if it has been modified
+						fingerprint = _valueFingerprint(self.accessedValues.get(key))
+						if fingerprint is not None:
+							self.valueHashes[key] = fingerprint
 				else:
 					self.accessedValues[key] = boneInstance.getDefaultValue(self)
 		if not self.renderPreparation:
 			return self.accessedValues.get(key)
-		value = self.renderPreparation(getattr(self, key), self, key, self.accessedValues.get(key))
+		value = self.renderPreparation(self.boneMap[key], self, key, self.accessedValues.get(key))
 		self.renderAccessedValues[key] = value
 		return value
 
 	def __getattr__(self, item):
+		"""
+			Returns the bone *item* (or one of the methods proxied from our skeleton class).
+
+			On instances sharing their bones with the skeleton class (fullClone), a shared bone is
+			deep-copied the first time it's read as attribute, even if it's not modified afterwards.
+			We can't defer that copy to the first assignment, as bones are also modified in place
+			(eg. skel.boneName.values["x"] = ...). Code only reading bones should use
+			skel.boneMap[boneName] (or items()) instead, which doesn't copy them.
+		"""
 		if item == "boneMap":
 			return {}  # There are __setAttr__ calls before __init__ has run
-		elif item in {"kindName", "interBoneValidations", "customDatabaseAdapter"}:
+		elif item in {"kindName", "interBoneValidations", "customDatabaseAdapter", "fromDBMulti"}:
 			return getattr(self.skeletonCls, item)
 		elif item in {"fromDB", "toDB", "all", "unserialize", "serialize", "fromClient", "getCurrentSEOKeys",
 					  "preProcessSerializedData", "preProcessBlobLocks", "postSavedHandler", "setBoneValue",
 					  "delete", "postDeletedHandler", "refresh"}:
 			return partial(getattr(self.skeletonCls, item), self)
-		return self.boneMap[item]
+		bone = self.boneMap[item]
+		if self.copyOnWrite and not bone.isClonedInstance:
+			# This bone is still shared with our skeleton class; give us our own copy before it's modified
+			bone = copy.deepcopy(bone)
+			bone.isClonedInstance = True
+			self.boneMap[item] = bone
+		return bone
 
 	def __delattr__(self, item):
 		del self.boneMap[item]
@@ -173,18 +444,21 @@ class SkeletonInstance:
 		return f"<SkeletonInstance of {self.skeletonCls.__name__} with {dict(self)}>"
 
 	def clone(self):
-		res = SkeletonInstance(self.skeletonCls, clonedBoneMap=copy.deepcopy(self.boneMap))
-		for k, v in res.boneMap.items():
-			v.isClonedInstance = True
+		# Bones we've modified are copied, the ones still shared with our skeleton class are copied on write
+		boneMap = {k: copy.deepcopy(v) if v.isClonedInstance else v for k, v in self.boneMap.items()}
+		res = SkeletonInstance(self.skeletonCls, fullClone=True, clonedBoneMap=boneMap)
 		res.dbEntity = copy.deepcopy(self.dbEntity)
 		res.accessedValues = copy.deepcopy(self.accessedValues)
 		res.renderAccessedValues = copy.deepcopy(self.renderAccessedValues)
+		res.projection = self.projection
+		res.valueHashes = self.valueHashes.copy() if self.valueHashes is not None else None
 		return res
 
 	def setEntity(self, entity: db.Entity):
 		self.dbEntity = entity
 		self.accessedValues = {}
 		self.renderAccessedValues = {}
+		self.valueHashes = None
 
 	def __deepcopy__(self, memodict):
 		res = self.clone()
@@ -245,6 +519,7 @@ class BaseSkeleton(object, metaclass=MetaBaseSkel):
 			bone = getattr(cls, attrName)
 			if isinstance(bone, baseBone):
 				bone.setSystemInitialized()
+		cls.__codec__ = _compileCodec(cls)
 
 	@classmethod
 	def setBoneValue(cls, skelValues, boneName, value, append=False):
@@ -263,7 +538,7 @@ class BaseSkeleton(object, metaclass=MetaBaseSkel):
 			:return: Wherever that operation succeeded or not.
 			:rtype: bool
 		"""
-		bone = getattr(skelValues, boneName, None)
+		bone = skelValues.boneMap.get(boneName)  # Not getattr, we won't modify the bone itself
 		if not isinstance(bone, baseBone):
 			raise ValueError("%s is no valid bone on this skeleton (%s)" % (boneName, str(skelValues)))
 		skelValues[boneName]  # FIXME, ensure this bone is unserialized first
@@ -311,19 +586,35 @@ class BaseSkeleton(object, metaclass=MetaBaseSkel):
 		return complete
 
 	@classmethod
-	def refresh(cls, skelValues):
+	def refresh(cls, skelValues) -> Dict[str, List[db.KeyClass]]:
 		"""
 			Refresh the bones current content.
 
 			This function causes a refresh of all relational bones and their associated
-			information.
+			information. The entries referenced by all relational bones that don't override
+			refresh() are fetched with one call.
+
+			:returns: Mapping of bone names to the keys of referenced entries that don't exist anymore
 		"""
+		referencedKeys = []
+		batchedBones = []  # (name, bone) of the relational bones refreshed from that call
 		for key, bone in skelValues.items():
 			if not isinstance(bone, baseBone):
 				continue
 			skelValues[key]  # Ensure value gets loaded
-			if "refresh" in dir(bone):
+			if isinstance(bone, relationalBone) and type(bone).refresh is relationalBone.refresh:
+				referencedKeys.extend(bone.getReferencedKeys(skelValues, key))
+				batchedBones.append((key, bone))
+			elif "refresh" in dir(bone):
 				bone.refresh(skelValues, key)
+		referencedKeys = list(set(referencedKeys))
+		entities = dict(zip(referencedKeys, db.GetMulti(referencedKeys))) if referencedKeys else {}
+		dangling = {}
+		for key, bone in batchedBones:
+			missing = bone.refreshReferences(skelValues, key, entities)
+			if missing:
+				dangling[key] = missing
+		return dangling
 
 	def __new__(cls, *args, **kwargs):
 		return SkeletonInstance(cls, *args, **kwargs)
@@ -561,18 +852,25 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 		# Load data into this skeleton
 		complete = super().fromClient(skelValues, data)
 
-		# Check if all unique values are available
+		# Check if all unique values are available; fetch all lock-objects we're interested in at once
+		uniqueLocks = []  # List of (boneName, boneInstance, lockKey)
 		for boneName, boneInstance in skelValues.items():
 			if boneInstance.unique:
 				lockValues = boneInstance.getUniquePropertyIndexValues(skelValues, boneName)
 				for lockValue in lockValues:
-					dbObj = db.Get(db.Key("%s_%s_uniquePropertyIndex" % (skelValues.kindName, boneName), lockValue))
-					if dbObj and (not skelValues["key"] or dbObj["references"] != skelValues["key"].id_or_name):
-						# This value is taken (sadly, not by us)
-						complete = False
-						errorMsg = boneInstance.unique.message
-						skelValues.errors.append(
-							ReadFromClientError(ReadFromClientErrorSeverity.Invalid, boneName, errorMsg))
+					uniqueLocks.append((boneName, boneInstance,
+										db.Key("%s_%s_uniquePropertyIndex" % (skelValues.kindName, boneName), lockValue)))
+		if uniqueLocks:
+			lockKeys = [x[2] for x in uniqueLocks]
+			lockObjs = dict(zip(lockKeys, db.GetMulti(lockKeys)))
+			for boneName, boneInstance, lockKey in uniqueLocks:
+				dbObj = lockObjs[lockKey]
+				if dbObj and (not skelValues["key"] or dbObj["references"] != skelValues["key"].id_or_name):
+					# This value is taken (sadly, not by us)
+					complete = False
+					errorMsg = boneInstance.unique.message
+					skelValues.errors.append(
+						ReadFromClientError(ReadFromClientErrorSeverity.Invalid, boneName, errorMsg))
 
 		# Check inter-Bone dependencies
 		for checkFunc in skelValues.interBoneValidations:
@@ -611,10 +909,48 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 		if dbRes is None:
 			return False
 		skelValues.setEntity(dbRes)
+		skelValues.valueHashes = {}  # Track which bones get modified, so toDB can skip the others
 		# key = str(dbRes.key())
 		skelValues["key"] = dbKey
 		return True
 
+	@classmethod
+	def fromDBMulti(cls, keys: List[Union[str, db.KeyClass]]) -> SkelList:
+		"""
+			Load the entities with the given *keys* from the data store with one call.
+
+			Keys can be given in any format accepted by :func:`~server.db.keyHelper`. Unlike calling
+			:func:`fromDB` in a loop, all entities are fetched by one :func:`~server.db.GetMulti` call.
+
+			:param keys: List of keys to load
+			:returns: A SkelList with one entry for each key (in the order given); entries for keys that did not \
+				parse or could not be found are None.
+		"""
+		dbKeys = []
+		for key in keys:
+			try:
+				dbKeys.append(db.keyHelper(key, cls.kindName))
+			except ValueError:  # This key did not parse
+				dbKeys.append(None)
+		validKeys = [x for x in dbKeys if x is not None]
+		entities = dict(zip(validKeys, db.GetMulti(validKeys)))
+		res = SkelList(cls())
+		seenEntities = set()
+		for dbKey in dbKeys:
+			dbRes = entities.get(dbKey) if dbKey is not None else None
+			if dbRes is None:
+				res.append(None)
+				continue
+			if id(dbRes) in seenEntities:  # The same key has been requested twice, don't share that entity
+				dbRes = copy.deepcopy(dbRes)
+			seenEntities.add(id(dbRes))
+			skel = cls()
+			skel.setEntity(dbRes)
+			skel.valueHashes = {}
+			skel["key"] = dbKey
+			res.append(skel)
+		return res
+
 	@classmethod
 	def toDB(cls, skelValues, clearUpdateTag=False):
 		"""
@@ -630,11 +966,14 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				This avoids from being fetched by the background task updating relations.
 			:type clearUpdateTag: bool
 
+			If the skeleton has been loaded by :func:`fromDB` and none of its values have been changed (apart from
+			those set by performMagic, like changedate), nothing is written and the relations aren't updated.
+
 			:returns: The data store key of the entity.
 			:rtype: str
 		"""
 
-		def txnUpdate(dbKey, mergeFrom, clearUpdateTag):
+		def txnUpdate(dbKey, mergeFrom, clearUpdateTag, magicBones):
 			blobList = set()
 			skel = skeletonByKind(mergeFrom.kindName)()
 			changeList = []
@@ -648,11 +987,16 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				dbObj["viur"] = {}
 				skel.dbEntity = dbObj
 				oldBlobLockObj = None
+				oldOutboxObj = None
 				isAdd = True
+				wasStored = False
 			else:
 				if isinstance(dbKey, str) or isinstance(dbKey, int):
 					dbKey = db.Key(skelValues.kindName, dbKey)
-				dbObj = db.Get(dbKey)
+				# Fetch the entity, its blob-lock object and its entry in the relations outbox with one call
+				dbObj, oldBlobLockObj, oldOutboxObj = db.GetMulti([
+					dbKey, db.Key("viur-blob-locks", dbKey.id_or_name), getRelationsOutboxKey(dbKey)])
+				wasStored = bool(dbObj)
 				if not dbObj:
 					dbObj = db.Entity(dbKey)
 					oldCopy = {}
@@ -660,14 +1004,17 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				else:
 					skel.setEntity(dbObj)
 					oldCopy = {k: v for k, v in dbObj.items()}
-				oldBlobLockObj = db.Get(db.Key("viur-blob-locks", dbKey.id_or_name))
 				isAdd = False
 			if not "viur" in dbObj:
 				dbObj["viur"] = {}
+			# Our meta-data is modified in place, keep a copy to tell if it has changed
+			oldViurData = {k: copy.deepcopy(v) for k, v in dbObj["viur"].items() if k != "delayedUpdateTag"}
 			# Merge values and assemble unique properties
 			# Move accessed Values from srcSkel over to skel
 			skel.accessedValues = mergeFrom.accessedValues
+			valueHashes = mergeFrom.valueHashes or {}
 			skel["key"] = dbKey  # Ensure key stayes set
+			uniqueValues = []  # List of (boneName, newUniqueValues, oldUniqueValues) for bones that must be unique
 			for key, bone in skel.items():
 				if key == "key":  # Explicitly skip key on top-level - this had been set above
 					continue
@@ -680,10 +1027,14 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				# Merge the values from mergeFrom in
 				if key in skel.accessedValues:
 					# bone.mergeFrom(skel.valuesCache, key, mergeFrom)
-					bone.serialize(skel, key, True)
+					if not clearUpdateTag and key in valueHashes and key in dbObj \
+							and valueHashes[key] == _valueFingerprint(skel.accessedValues[key]):
+						pass  # Unchanged since it has been loaded; keep what's stored
+					else:
+						_getSerializer(skel, key, bone)(skel, True)
 				elif key not in skel.dbEntity:  # It has not been written and is not in the database
 					_ = skel[key]  # Ensure the datastore is filled with the default value
-					bone.serialize(skel, key, True)
+					_getSerializer(skel, key, bone)(skel, True)
 
 				## Serialize bone into entity
 				# dbObj = bone.serialize(skel.valuesCache, key, dbObj)
@@ -695,12 +1046,27 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				if dbObj.get(key) != oldCopy.get(key):
 					changeList.append(key)
 
-				# Lock hashes from bones that must have unique values
+				# Remember the new hashes from bones that must have unique values, they're locked below
 				if bone.unique:
+					uniqueValues.append((key, bone.getUniquePropertyIndexValues(skel, key), oldUniqueValues))
+
+			# Lock hashes from bones that must have unique values.
+			# All lock-objects are fetched with one call; new and stale locks are written in one batch each.
+			if uniqueValues:
+				lockKeys = []
+				for key, newUniqueValues, oldUniqueValues in uniqueValues:
+					lockKind = "%s_%s_uniquePropertyIndex" % (skel.kindName, key)
+					lockKeys.extend([db.Key(lockKind, x) for x in chain(newUniqueValues, oldUniqueValues)])
+				lockObjs = dict(zip(lockKeys, db.GetMulti(lockKeys)))
+				newLockObjs = {}
+				staleLockKeys = set()
+				for key, newUniqueValues, oldUniqueValues in uniqueValues:
+					lockKind = "%s_%s_uniquePropertyIndex" % (skel.kindName, key)
+					oldUniqueValues = list(oldUniqueValues)
 					# Check if the property is really unique
-					newUniqueValues = bone.getUniquePropertyIndexValues(skel, key)
 					for newLockValue in newUniqueValues:
-						lockObj = db.Get(db.Key("%s_%s_uniquePropertyIndex" % (skel.kindName, key), newLockValue))
+						lockKey = db.Key(lockKind, newLockValue)
+						lockObj = lockObjs[lockKey]
 						if lockObj:
 							# There's already a lock for that value, check if we hold it
 							if lockObj["references"] != dbObj.key.id_or_name:
@@ -710,19 +1076,16 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 									(skelValues[key], key))
 						else:
 							# This value is locked for the first time, create a new lock-object
-							newLockObj = db.Entity(db.Key(
-								"%s_%s_uniquePropertyIndex" % (skel.kindName, key),
-								newLockValue))
+							newLockObj = db.Entity(lockKey)
 							newLockObj["references"] = dbObj.key.id_or_name
-							db.Put(newLockObj)
+							newLockObjs[lockKey] = newLockObj
 						if newLockValue in oldUniqueValues:
 							oldUniqueValues.remove(newLockValue)
 					dbObj["viur"]["%s_uniqueIndexValue" % key] = newUniqueValues
 					# Remove any lock-object we're holding for values that we don't have anymore
 					for oldValue in oldUniqueValues:
-						# Try to delete the old lock
-						oldLockKey = db.Key("%s_%s_uniquePropertyIndex" % (skel.kindName, key), oldValue)
-						oldLockObj = db.Get(oldLockKey)
+						oldLockKey = db.Key(lockKind, oldValue)
+						oldLockObj = lockObjs[oldLockKey]
 						if oldLockObj:
 							if oldLockObj["references"] != dbObj.key.id_or_name:
 								# We've been supposed to have that lock - but we don't.
@@ -730,9 +1093,16 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 								logging.critical("Detected Database corruption! A Value-Lock had been reassigned!")
 							else:
 								# It's our lock which we don't need anymore
-								db.Delete(oldLockKey)
+								staleLockKeys.add(oldLockKey)
 						else:
 							logging.critical("Detected Database corruption! Could not delete stale lock-object!")
+				if newLockObjs:
+					db.Put(list(newLockObjs.values()))
+				if staleLockKeys:
+					db.Delete(list(staleLockKeys))
+
+			# Mark the properties that must not be indexed
+			_applyIndexSchema(skel, True)
 
 			# Ensure the SEO-Keys are up2date
 			lastRequestedSeoKeys = dbObj["viur"].get("viurLastRequestedSeoKeys") or {}
@@ -756,28 +1126,53 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 						.replace("&", "") \
 						.replace("#", "").strip()
 					currentSeoKeys[lang] = value
+			# Collect the keys we'd like to claim in the SEO-Key registry, so they can be checked with one call
+			seoKeyCandidates = {}  # Mapping language -> candidates, in order of preference
 			for language in (conf["viur.availableLanguages"] or [conf["viur.defaultLanguage"]]):
 				if currentSeoKeys and language in currentSeoKeys:
 					currentKey = currentSeoKeys[language]
-					if currentKey != lastRequestedSeoKeys.get(language):  # This one is new or has changed
-						newSeoKey = currentSeoKeys[language]
-						for _ in range(0, 3):
-							entryUsingKey = db.Query(skelValues.kindName).filter("viurActiveSeoKeys =", newSeoKey).get()
-							if entryUsingKey and entryUsingKey.name != dbObj.name:
-								# It's not unique; append a random string and try again
-								newSeoKey = "%s-%s" % (currentSeoKeys[language], utils.generateRandomString(5).lower())
-							else:
-								break
+					if currentKey != lastRequestedSeoKeys.get(language) or not lastSetSeoKeys.get(language):
+						# This one is new or has changed; if it's taken, we'll try it with a random string appended
+						seoKeyCandidates[language] = [currentKey] + [
+							"%s-%s" % (currentKey, utils.generateRandomString(5).lower()) for _ in range(0, 2)]
+					else:  # Unchanged, ensure it's registered (it might have been set before the registry existed)
+						seoKeyCandidates[language] = [lastSetSeoKeys[language]]
+			registryKeys = [getSeoKeyRegistryKey(skelValues.kindName, language, x)
+							for language, candidates in seoKeyCandidates.items() for x in candidates]
+			registryEntries = dict(zip(registryKeys, db.GetMulti(registryKeys)))
+			newRegistryEntries = []
+			for language in (conf["viur.availableLanguages"] or [conf["viur.defaultLanguage"]]):
+				if language in seoKeyCandidates:
+					for newSeoKey in seoKeyCandidates[language]:
+						registryKey = getSeoKeyRegistryKey(skelValues.kindName, language, newSeoKey)
+						registryEntry = registryEntries[registryKey]
+						if registryEntry is not None:
+							holderKey = registryEntry["target"]
 						else:
-							raise ValueError("Could not generate an unique seo key in 3 attempts")
+							holderKey = _findLegacySeoKeyHolder(skelValues.kindName, newSeoKey)
+						if holderKey is None or holderKey == dbObj.key:
+							break
+						if len(seoKeyCandidates[language]) == 1:  # Unchanged, but claimed by another entry
+							logging.warning("SEO-Key %s of %s is also used by %s" % (newSeoKey, dbObj.key, holderKey))
+							break
 					else:
-						newSeoKey = currentKey
+						raise ValueError("Could not generate an unique seo key in 3 attempts")
+					if registryEntry is None and (holderKey is None or holderKey == dbObj.key):
+						registryEntry = db.Entity(registryKey)
+						registryEntry["target"] = dbObj.key
+						registryEntry["kindName"] = skelValues.kindName
+						registryEntry["language"] = language
+						registryEntry["seoKey"] = newSeoKey
+						registryEntry.exclude_from_indexes = {"kindName", "language", "seoKey"}
+						newRegistryEntries.append(registryEntry)
 					lastSetSeoKeys[language] = newSeoKey
 				else:
 					# We'll use the database-key instead
 					lastSetSeoKeys[language] = dbObj.key.id_or_name
 				# Store the current, active key for that language
 				dbObj["viur"]["viurCurrentSeoKeys"][language] = lastSetSeoKeys[language]
+			if newRegistryEntries:
+				db.Put(newRegistryEntries)
 			if not dbObj["viur"].get("viurActiveSeoKeys"):
 				dbObj["viur"]["viurActiveSeoKeys"] = []
 			for language, seoKey in lastSetSeoKeys.items():
@@ -787,11 +1182,21 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 			if dbObj.key.id_or_name not in dbObj["viur"]["viurActiveSeoKeys"]:
 				# Ensure that key is also in there
 				dbObj["viur"]["viurActiveSeoKeys"].insert(0, str(dbObj.key.id_or_name))
-			# Trim to the last 200 used entries
+			# Trim to the last 200 used entries and release the registry entries of the keys we dropped
+			droppedSeoKeys = [x for x in dbObj["viur"]["viurActiveSeoKeys"][200:]
+							  if x not in dbObj["viur"]["viurActiveSeoKeys"][:200]]
 			dbObj["viur"]["viurActiveSeoKeys"] = dbObj["viur"]["viurActiveSeoKeys"][:200]
+			if droppedSeoKeys:
+				db.onTransactionCommit(partial(_releaseSeoKeys, skelValues.kindName, dbObj.key, droppedSeoKeys))
 			# Store lastRequestedKeys so further updates can run more efficient
 			dbObj["viur"]["viurLastRequestedSeoKeys"] = currentSeoKeys
 
+			if not clearUpdateTag and wasStored and oldBlobLockObj is not None and not set(changeList) - magicBones \
+					and oldViurData == {k: v for k, v in dbObj["viur"].items() if k != "delayedUpdateTag"}:
+				# Nothing but the values set by performMagic (eg. changedate) has changed; there's no need to write.
+				# Saves with clearUpdateTag (eg. rebuilding the search index) are always serialized and written.
+				return dbObj.key, dbObj, skel, [], False
+
 			if clearUpdateTag:
 				# Mark this entity as Up-to-date.
 				dbObj["viur"]["delayedUpdateTag"] = 0
@@ -807,6 +1212,13 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 			# Write the core entry back
 			db.Put(dbObj)
 
+			if not clearUpdateTag and not isAdd and changeList:
+				# Record our changes in the same transaction, so our references get updated even if we die
+				# right after the commit. Following changes made before they're processed will be merged in.
+				outboxObj = _mergeRelationsOutboxEntry(oldOutboxObj, dbKey, changeList)
+				db.Put(outboxObj)
+				db.onTransactionCommit(partial(processRelationsOutboxEntry, outboxObj.key))
+
 			# Now write the blob-lock object
 			blobList = skel.preProcessBlobLocks(blobList)
 			if blobList is None:
@@ -836,7 +1248,7 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 				blobLockObj["is_stale"] = False
 				db.Put(blobLockObj)
 
-			return dbObj.key, dbObj, skel, changeList
+			return dbObj.key, dbObj, skel, changeList, True
 
 		# END of txnUpdate subfunction
 
@@ -848,28 +1260,30 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 					type(clearUpdateTag)))
 
 		# Allow bones to perform outstanding "magic" operations before saving to db
+		magicBones = set()  # Bones that have been set by performMagic (like changedate)
 		for bkey, _bone in skelValues.items():
+			oldValue = skelValues.accessedValues.get(bkey, __undefindedC__)
 			_bone.performMagic(skelValues, bkey, isAdd=isAdd)
+			if skelValues.accessedValues.get(bkey, __undefindedC__) is not oldValue:
+				magicBones.add(bkey)
 
 		# Run our SaveTxn
 		if db.IsInTransaction():
-			key, dbObj, skel, changeList = txnUpdate(key, skelValues, clearUpdateTag)
+			key, dbObj, skel, changeList, isWritten = txnUpdate(key, skelValues, clearUpdateTag, magicBones)
 		else:
-			key, dbObj, skel, changeList = db.RunInTransaction(txnUpdate, key, skelValues, clearUpdateTag)
+			key, dbObj, skel, changeList, isWritten = db.RunInTransaction(txnUpdate, key, skelValues, clearUpdateTag,
+																				   magicBones)
 
 		# Perform post-save operations (postProcessSerializedData Hook, Searchindex, ..)
 		skelValues["key"] = key
 
-		for boneName, bone in skel.items():
-			bone.postSavedHandler(skel, boneName, key)
+		if isWritten:
+			for boneName, bone in skel.items():
+				bone.postSavedHandler(skel, boneName, key)
 
 		skel.postSavedHandler(key, dbObj)
 
-		if not clearUpdateTag and not isAdd:
-			updateRelations(key, time() + 1,
-							changeList if len(changeList) < 30 else None)
-
-		# Inform the custom DB Adapter of the changes made to the entry
+		# Inform the custom DB Adapter of the changes made to the entry (even if there were none)
 		if skelValues.customDatabaseAdapter:
 			skelValues.customDatabaseAdapter.updateEntry(dbObj, skel, changeList, isAdd)
 
@@ -936,6 +1350,11 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 						db.Delete((
 							"%s_%s_uniquePropertyIndex" % (skel.kindName, boneName),
 							dbObj["%s_uniqueIndexValue" % boneName]))
+			# Release the SEO-Keys this entry has claimed in the registry once committed; these might be too many
+			# to be deleted inside this transaction
+			activeSeoKeys = (dbObj.get("viur") or {}).get("viurActiveSeoKeys") or []
+			if activeSeoKeys:
+				db.onTransactionCommit(partial(_releaseSeoKeys, skel.kindName, skelKey, activeSeoKeys))
 			# Delete the blob-key lock object
 			lockObjectKey = db.Key("viur-blob-locks", dbObj.key.id_or_name)
 			lockObj = db.Get(lockObjectKey)
@@ -954,7 +1373,8 @@ class Skeleton(BaseSkeleton, metaclass=MetaSkel):
 					lockObj["has_old_blob_references"] = True
 					db.Put(lockObj)
 			db.Delete(skelKey)
-			processRemovedRelations(skelKey)
+			# Only once committed - this transaction might be retried or rolled back
+			db.onTransactionCommit(partial(processRemovedRelations, skelKey))
 			return dbObj
 
 		key = skelValues["key"]
@@ -1025,7 +1445,8 @@ class RelSkel(BaseSkeleton):
 			self.dbEntity = db.Entity()
 		for key, _bone in self.items():
 			# if key in self.accessedValues:
-			_bone.serialize(self, key, parentIndexed)
+			_getSerializer(self, key, _bone)(self, parentIndexed)
+		_applyIndexSchema(self, parentIndexed)
 		# if "key" in self:  # Write the key seperatly, as the base-bone doesn't store it
 		#	dbObj["key"] = self["key"]
 		# FIXME: is this a good idea? Any other way to ensure only bones present in refKeys are serialized?
@@ -1105,6 +1526,24 @@ class SkelList(list):
 		self.renderPreparation = None
 		self.customQueryInfo = {}
 
+	def unserializeAll(self):
+		"""
+			Unserializes all bones of all skeletons in this list in one pass, using the codec compiled
+			for their skeleton class, instead of unserializing them one by one once they're accessed.
+		"""
+		boneMap = None
+		plan = []
+		for skel in self:
+			if skel.dbEntity is None:
+				continue
+			if skel.boneMap is not boneMap:  # Skeletons fetched by the same query share their boneMap
+				boneMap = skel.boneMap
+				plan = [(name, _getUnserializer(skel, name, bone)) for name, bone in boneMap.items()]
+			accessedValues = skel.accessedValues
+			for name, unserializer in plan:
+				if name not in accessedValues:
+					unserializer(skel)
+
 	def no__iter__(self):
 		for cacheItem in super(SkelList, self).__iter__():
 			self.baseSkel.setValuesCache(cacheItem)
@@ -1126,9 +1565,14 @@ def processRemovedRelations(removedKey, cursor=None):
 		.filter("viur_relational_consistency >", 2)
 	updateListQuery = updateListQuery.setCursor(cursor)
 	updateList = updateListQuery.run(limit=5)
+	srcSkels = {}  # Load the referencing skeletons with one call per kind
+	for kindName in {x["viur_src_kind"] for x in updateList}:
+		entries = [x for x in updateList if x["viur_src_kind"] == kindName]
+		skels = skeletonByKind(kindName).fromDBMulti([x["src"].key for x in entries])
+		srcSkels.update({x.key: skel for x, skel in zip(entries, skels)})
 	for entry in updateList:
-		skel = skeletonByKind(entry["viur_src_kind"])()
-		assert skel.fromDB(entry["src"].key)
+		skel = srcSkels[entry.key]
+		assert skel is not None
 		if entry["viur_relational_consistency"] == 3:  # Set Null
 			for key, _bone in skel.items():
 				if isinstance(_bone, relationalBone):
@@ -1150,38 +1594,179 @@ def processRemovedRelations(removedKey, cursor=None):
 		processRemovedRelations(removedKey, updateListQuery.getCursor())
 
 
+__relationRefreshStats__: Dict[str, Dict[str, Union[int, float]]] = {}
+__relationRefreshStatsLock__ = threading.Lock()
+
+
+def getRelationRefreshStats() -> Dict[str, Dict[str, Union[int, float]]]:
+	"""
+		Returns the counters of :func:`updateRelations` on this instance per kind of the changed entity:
+		Batches processed, relations and referencing entries updated, seconds spent, and the lag
+		(seconds between the change and its propagation) of the last batch and the worst one seen.
+	"""
+	with __relationRefreshStatsLock__:
+		return {k: v.copy() for k, v in __relationRefreshStats__.items()}
+
+
+def _recordRelationRefresh(destKind: str, relations: int, entries: int, duration: float, lag: float) -> None:
+	with __relationRefreshStatsLock__:
+		stats = __relationRefreshStats__.setdefault(destKind, {
+			"batches": 0, "relations": 0, "entries": 0, "duration": 0.0, "lastLag": 0.0, "maxLag": 0.0})
+		stats["batches"] += 1
+		stats["relations"] += relations
+		stats["entries"] += entries
+		stats["duration"] += duration
+		stats["lastLag"] = lag
+		stats["maxLag"] = max(stats["maxLag"], lag)
+
+
+__relationRefreshExecutor__ = None
+
+
+def _getRelationRefreshExecutor() -> ThreadPoolExecutor:
+	"""
+		Returns the thread pool running the transactions of :func:`updateRelations`, creating it on first use.
+		It's not shared with the bulk executor of db, as these transactions use that one themselves.
+	"""
+	global __relationRefreshExecutor__
+	if __relationRefreshExecutor__ is None:
+		with __relationRefreshStatsLock__:
+			if __relationRefreshExecutor__ is None:
+				__relationRefreshExecutor__ = ThreadPoolExecutor(max_workers=conf["viur.relations.refreshThreads"],
+																 thread_name_prefix="viur-relations-refresh")
+	return __relationRefreshExecutor__
+
+
 @callDeferred
 def updateRelations(destID, minChangeTime, changeList, cursor=None):
+	"""
+		Updates the values cached from the entity *destID* in all entries referencing it.
+
+		The affected viur-relations entries are processed in batches of conf["viur.relations.refreshBatchSize"],
+		grouped by the entry referencing us. The changed entity is fetched once; each referencing entry
+		is loaded and saved in its own transaction, up to conf["viur.relations.refreshThreads"] of them
+		concurrently.
+	"""
 	logging.debug("Starting updateRelations for %s ; minChangeTime %s, Changelist: %s", destID, minChangeTime,
 				  changeList)
+	startTime = time()
+	batchSize = conf["viur.relations.refreshBatchSize"]
 	updateListQuery = db.Query("viur-relations").filter("dest.__key__ =", destID) \
 		.filter("viur_delayed_update_tag <", minChangeTime).filter("viur_relational_updateLevel =", 0)
 	if changeList:
 		updateListQuery.filter("viur_foreign_keys IN", changeList)
 	if cursor:
 		updateListQuery.setCursor(cursor)
-	updateList = updateListQuery.run(limit=5)
+	updateList = updateListQuery.run(limit=batchSize)
+	if not updateList:
+		return
+	# Bypass our caches - we're usually not running on the instance that wrote the change
+	# and must not copy an outdated version into all the referencing entries
+	destEntity = db.Get(destID, useCache=False)
+	if destEntity is None:
+		logging.info("The key %s does not exist" % destID)
+		return
 
-	def updateTxn(skel, key, srcRelKey):
-		if not skel.fromDB(key):
-			logging.warning("Cannot update stale reference to %s (referenced from %s)" % (key, srcRelKey))
+	# Group the relations by the entry referencing us - it might do so in several bones
+	srcBoneNames = {}  # Mapping key -> names of the bones referencing destID
+	srcKinds = {}  # Mapping kindName -> keys of that kind
+	for srcRel in updateList:
+		srcKey = srcRel["src"].key
+		if srcKey not in srcBoneNames:
+			srcBoneNames[srcKey] = set()
+			srcKinds.setdefault(srcRel["viur_src_kind"], []).append(srcKey)
+		srcBoneNames[srcKey].add(srcRel["viur_src_property"])
+
+	def updateTxn(skelCls, srcKey):
+		skel = skelCls()
+		if not skel.fromDB(srcKey):
+			logging.warning("Cannot update stale reference to %s (referenced from %s)" % (srcKey, destID))
 			return
-		for key, _bone in skel.items():
-			_bone.refresh(skel, key)
+		for boneName in srcBoneNames[srcKey]:
+			bone = skel.boneMap.get(boneName)
+			if isinstance(bone, relationalBone):
+				bone.updateReferencedValues(skel, boneName, destEntity)
 		skel.toDB(clearUpdateTag=True)
 
-	for srcRel in updateList:
+	updateCalls = []
+	for kindName, srcKeys in srcKinds.items():
 		try:
-			skel = skeletonByKind(srcRel["viur_src_kind"])()
+			skelCls = skeletonByKind(kindName)
 		except AssertionError:
-			logging.info("Deleting %s which refers to unknown kind %s" % (str(srcRel.key), srcRel["viur_src_kind"]))
+			logging.info("Skipping %s entries which refer to unknown kind %s" % (len(srcKeys), kindName))
 			continue
-		db.RunInTransaction(updateTxn, skel, srcRel["src"].key, srcRel.key)
+		updateCalls.extend([partial(db.RunInTransaction, updateTxn, skelCls, srcKey) for srcKey in srcKeys])
+	if len(updateCalls) < 2 or conf["viur.relations.refreshThreads"] < 2:
+		for updateCall in updateCalls:
+			updateCall()
+	else:
+		# Each call runs in a copy of our context, as a context can't be entered by several threads at once
+		futures = [_getRelationRefreshExecutor().submit(copy_context().run, x) for x in updateCalls]
+		for future in futures:
+			future.result()
+	duration = time() - startTime
+	lag = time() - minChangeTime
+	_recordRelationRefresh(destID.kind, len(updateList), len(srcBoneNames), duration, lag)
+	logging.info("updateRelations updated %s relations in %s entries referencing %s in %.2fs (lag %.1fs)" % (
+		len(updateList), len(srcBoneNames), destID, duration, lag))
 	nextCursor = updateListQuery.getCursor()
-	if len(updateList) == 5 and nextCursor:
+	if len(updateList) == batchSize and nextCursor:
 		updateRelations(destID, minChangeTime, changeList, nextCursor)
 
 
+def _processRelationsOutboxEntry(outboxObj: db.Entity) -> None:
+	"""
+		Starts updating the entries referencing the entry recorded in *outboxObj* and removes that
+		outbox entry, unless it has been changed again in the meantime.
+	"""
+	updateRelations(outboxObj["dest"], outboxObj["updateTime"] + 1, outboxObj["changeList"])
+
+	def txnDelete(outboxKey, updateTime):
+		currentObj = db.Get(outboxKey)
+		if currentObj is not None and currentObj["updateTime"] == updateTime:
+			db.Delete(outboxKey)
+
+	db.RunInTransaction(txnDelete, outboxObj.key, outboxObj["updateTime"])
+
+
+@callDeferred
+def processRelationsOutboxEntry(outboxKey: db.KeyClass):
+	"""
+		Processes the given entry of the relations outbox; scheduled by :meth:`Skeleton.toDB` once its
+		changes have been committed. If an entry has been saved several times in a row, only the first of
+		these tasks will find the outbox entry (containing all changes made so far) and start updating its
+		references; the others have nothing left to do.
+	"""
+	# Bypass the caches - we must see the latest state of that entry
+	outboxObj = db.Get(outboxKey, useCache=False)
+	if outboxObj is None:
+		return
+	_processRelationsOutboxEntry(outboxObj)
+
+
+@PeriodicTask(0)
+def startDrainRelationsOutbox():
+	"""
+		Processes entries left in the relations outbox (eg. because the instance died after committing
+		the change, but before the task processing it could be enqueued).
+	"""
+	drainRelationsOutbox()
+
+
+@callDeferred
+def drainRelationsOutbox(cursor=None):
+	query = db.Query(relationsOutboxKindName) \
+		.filter("updateTime <", time() - conf["viur.relations.outboxGracePeriod"])
+	if cursor:
+		query.setCursor(cursor)
+	outboxEntries = query.run(100)
+	for outboxObj in outboxEntries:
+		_processRelationsOutboxEntry(outboxObj)
+	newCursor = query.getCursor()
+	if len(outboxEntries) == 100 and newCursor:
+		drainRelationsOutbox(newCursor)
+
+
 @CallableTask
 class TaskUpdateSearchIndex(CallableTaskBase):
 	"""
@@ -1221,17 +1806,48 @@ class TaskUpdateSearchIndex(CallableTaskBase):
 		else:
 			notify = usr["name"]
 		if module == "*":
-			for module in listKnownSkeletons():
-				logging.info("Rebuilding search index for module '%s'" % module)
-				processChunk(module, compact, None, notify=notify)
+			modules = listKnownSkeletons()
+		elif not skeletonByKind(module):
+			logging.error("TaskUpdateSearchIndex: Invalid module")
+			return
 		else:
-			processChunk(module, compact, None, notify=notify)
+			modules = [module]
+		if compact == "YES":
+			# FIXME: Recreating entities would delete the __currentKey__ property..
+			logging.error("TaskUpdateSearchIndex: Recreating entities is currently not supported")
+			return
+		for module in modules:
+			logging.info("Rebuilding search index for module '%s'" % module)
+			startShardedScan(module, rebuildSearchIndexBatch, params={"module": module},
+							 name="Rebuild search index for %s" % module, notify=notify)
+
+
+@ShardedScanHandler
+def rebuildSearchIndexBatch(entities, module, compact=None):
+	"""
+		Loads and saves the given entities of the given module; used by TaskUpdateSearchIndex.
+		*compact* is only accepted for scans started before it has been rejected by TaskUpdateSearchIndex.
+	"""
+	Skel = skeletonByKind(module)
+	for obj, skel in zip(entities, Skel.fromDBMulti([x.key for x in entities])):
+		if skel is None:  # Deleted in the meantime
+			continue
+		try:
+			dangling = skel.refresh()
+			if dangling:
+				logging.warning("%s references entries which don't exist anymore: %s" % (obj.key, dangling))
+			skel.toDB(clearUpdateTag=True)
+		except Exception as e:
+			logging.error("Updating %s failed" % str(obj.key))
+			logging.exception(e)
+			raise
 
 
 @callDeferred
 def processChunk(module, compact, cursor, allCount=0, notify=None):
 	"""
-		Processes 100 Entries and calls the next batch
+		Processes 100 Entries and calls the next batch.
+		Superseded by rebuildSearchIndexBatch; kept to finish chains that have already been queued.
 	"""
 	Skel = skeletonByKind(module)
 	if not Skel:
@@ -1239,11 +1855,12 @@ def processChunk(module, compact, cursor, allCount=0, notify=None):
 		return
 	query = Skel().all().setCursor(cursor)
 	count = 0
-	for obj in query.run(25):
+	entities = query.run(25)
+	for obj, skel in zip(entities, Skel.fromDBMulti([x.key for x in entities])):
 		count += 1
+		if skel is None:  # Deleted in the meantime
+			continue
 		try:
-			skel = Skel()
-			skel.fromDB(obj.key)
 			if compact == "YES":
 				raise NotImplementedError()  # FIXME: This deletes the __currentKey__ property..
 				skel.delete()
@@ -1302,13 +1919,48 @@ class TaskVacuumRelations(CallableTaskBase):
 			notify = None
 		else:
 			notify = usr["name"]
-		processVacuumRelationsChunk(module.strip(), None, notify=notify)
+		module = module.strip()
+		startShardedScan("viur-relations", vacuumRelationsBatch,
+						 filters={"viur_src_kind =": module} if module != "*" else None,
+						 name="Vacuum viur-relations for %s" % module, notify=notify)
+
+
+@ShardedScanHandler
+def vacuumRelationsBatch(entities):
+	"""
+		Drops the given relation objects if their src-kind or relationalBone doesn't exist anymore;
+		used by TaskVacuumRelations.
+	"""
+	staleKeys = []
+	for relationObject in entities:
+		srcKind = relationObject.get("viur_src_kind")
+		if not srcKind:
+			logging.critical("We got an relation-object without a srcKind!")
+			continue
+		srcProp = relationObject.get("viur_src_property")
+		if not srcProp:
+			logging.critical("We got an relation-object without a srcProp!")
+			continue
+		try:
+			skel = skeletonByKind(srcKind)()
+		except AssertionError:
+			# The referenced skeleton does not exist in this data model -> drop that relation object
+			logging.info("Deleting %r which refers to unknown kind %s", str(relationObject.key), srcKind)
+			staleKeys.append(relationObject.key)
+			continue
+		if srcProp not in skel:
+			logging.info("Deleting %r which refers to non-existing relationalBone %s of %s",
+						 str(relationObject.key), srcProp, srcKind)
+			staleKeys.append(relationObject.key)
+	db.Delete(staleKeys)
+	return {"removed": len(staleKeys)}
 
 
 @callDeferred
 def processVacuumRelationsChunk(module, cursor, allCount=0, removedCount=0, notify=None):
 	"""
-		Processes 100 Entries and calls the next batch
+		Processes 100 Entries and calls the next batch.
+		Superseded by vacuumRelationsBatch; kept to finish chains that have already been queued.
 	"""
 	query = db.Query("viur-relations")
 	if module != "*":
@@ -1361,3 +2013,88 @@ def processVacuumRelationsChunk(module, cursor, allCount=0, removedCount=0, noti
 # Forward references to SkelList and SkelInstance
 db.SkeletonInstanceRef = SkeletonInstance
 db.SkelListRef = SkelList
+
+
+### Backfill SEO-Key registry
+
+@CallableTask
+class TaskBackfillSeoKeyRegistry(CallableTaskBase):
+	"""
+	Registers the SEO-Keys of entries saved before the SEO-Key registry existed. Once it finished for all
+	modules, viur.seoKeys.legacyLookup can be disabled.
+	"""
+	key = "backfillSeoKeyRegistry"
+	name = u"Backfill SEO-Key registry"
+	descr = u"Registers the SEO-Keys of existing entries in the SEO-Key registry"
+
+	def canCall(self):
+		"""
+		Checks wherever the current user can execute this task
+		:returns: bool
+		"""
+		user = utils.getCurrentUser()
+		return user is not None and "root" in user["access"]
+
+	def dataSkel(self):
+		modules = ["*"] + listKnownSkeletons()
+		skel = BaseSkeleton().clone()
+		skel.module = selectBone(descr="Module", values={x: x for x in modules}, required=True)
+		return skel
+
+	def execute(self, module, *args, **kwargs):
+		usr = utils.getCurrentUser()
+		if not usr:
+			logging.warning("Don't know who to inform after backfilling finished")
+			notify = None
+		else:
+			notify = usr["name"]
+		if module == "*":
+			modules = listKnownSkeletons()
+		elif not skeletonByKind(module):
+			logging.error("TaskBackfillSeoKeyRegistry: Invalid module")
+			return
+		else:
+			modules = [module]
+		for module in modules:
+			startShardedScan(module, backfillSeoKeyRegistryBatch, params={"kindName": module},
+							 name="Backfill SEO-Key registry for %s" % module, notify=notify)
+
+
+@ShardedScanHandler
+def backfillSeoKeyRegistryBatch(entities, kindName):
+	"""
+		Registers the SEO-Keys held by the given entities in their viurActiveSeoKeys; used by
+		TaskBackfillSeoKeyRegistry. Current keys are registered for their language, older ones (which
+		were unique regardless of the language) for all languages. Keys already claimed are left untouched.
+	"""
+	languages = conf["viur.availableLanguages"] or [conf["viur.defaultLanguage"]]
+	wantedEntries = {}  # Mapping registry key -> (language, seoKey, key of the entity holding it)
+	for entity in entities:
+		viurData = entity.get("viur") or {}
+		currentSeoKeys = viurData.get("viurCurrentSeoKeys") or {}
+		for seoKey in viurData.get("viurActiveSeoKeys") or []:
+			if not seoKey or seoKey == str(entity.key.id_or_name):
+				continue  # That's the key of the entity itself, it's resolved without the registry
+			seoKeyLanguages = [x for x in languages if currentSeoKeys.get(x) == seoKey] or languages
+			for language in seoKeyLanguages:
+				registryKey = getSeoKeyRegistryKey(kindName, language, seoKey)
+				wantedEntries.setdefault(registryKey, (language, seoKey, entity.key))
+	registryKeys = list(wantedEntries.keys())
+	missingKeys = [k for k, v in zip(registryKeys, db.GetMulti(registryKeys)) if v is None]
+
+	def registerTxn(registryKey):
+		# Check again, as that key might have been claimed by toDB in the meantime
+		if db.Get(registryKey) is not None:
+			return False
+		language, seoKey, targetKey = wantedEntries[registryKey]
+		registryEntry = db.Entity(registryKey)
+		registryEntry["target"] = targetKey
+		registryEntry["kindName"] = kindName
+		registryEntry["language"] = language
+		registryEntry["seoKey"] = seoKey
+		registryEntry.exclude_from_indexes = {"kindName", "language", "seoKey"}
+		db.Put(registryEntry)
+		return True
+
+	registered = len([x for x in missingKeys if db.RunInTransaction(registerTxn, x)])
+	return {"registered": registered}
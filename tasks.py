@@ -3,9 +3,12 @@ import json
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import timedelta
 from functools import wraps
-from typing import Callable, Dict, Any
+from time import time
+from typing import Callable, Dict, Any, List, Union
 #from google.cloud import tasks_v2
 from google.protobuf import timestamp_pb2
 from viur.core import db, errors, utils
@@ -322,6 +325,20 @@ class TaskHandler:
 
 	execute.exposed = True
 
+	def queryIndexes(self, *args, **kwargs):
+		"""
+			Returns the composite index definitions (index.yaml) required by the queries recorded by this
+			instance so far. Queries that had to be merged or resorted in memory are listed on top.
+			Only available to root users.
+		"""
+		usr = utils.getCurrentUser()
+		if not usr or not usr["access"] or "root" not in usr["access"]:
+			raise errors.Unauthorized()
+		currentRequest.get().response.headers["Content-Type"] = "text/plain; charset=utf-8"
+		return db.queryShapeRecorder.exportIndexDefinitions()
+
+	queryIndexes.exposed = True
+
 
 TaskHandler.admin = True
 TaskHandler.vi = True
@@ -512,6 +529,251 @@ def runStartupTasks():
 		st()
 
 
+## Sharded scans ##
+
+_scanHandlers: Dict[str, Callable] = {}
+shardedScanKindName = "viur-sharded-scans"
+shardedScanShardKindName = "viur-sharded-scan-shards"
+
+
+def ShardedScanHandler(fn):
+	"""
+		Registers a function to process the entities visited by :func:`startShardedScan`.
+
+		It's called with a list of entities and the params given to startShardedScan as keyword arguments.
+		It may return a dictionary of counters (eg. {"removed": 3}) which are summed up over the whole scan.
+		As each shard is checkpointed after each batch, a batch might be processed twice if a task is
+		retried - handlers must therefore be idempotent.
+	"""
+	_scanHandlers["%s.%s" % (fn.__name__, fn.__module__)] = fn
+	return fn
+
+
+def startShardedScan(kind: str, handler: Callable, params: Union[None, Dict[str, Any]] = None,
+					 filters: Union[None, Dict[str, Any]] = None, shardCount: Union[None, int] = None,
+					 batchSize: Union[None, int] = None, name: Union[None, str] = None,
+					 notify: Union[None, str] = None, inline: bool = False) -> str:
+	"""
+		Visits all entities of the given kind and passes them in batches to *handler*.
+
+		The kind is split into *shardCount* key-ranges using :func:`viur.core.db.getKeyRangeSplitPoints`.
+		Each range (shard) is processed by its own chain of deferred tasks (or by a local thread pool if
+		*inline* is set). Each shard checkpoints its cursor after each batch, so a scan can be continued by
+		:func:`resumeShardedScan` if it has been interrupted. Its progress and throughput can be
+		retrieved using :func:`getShardedScanProgress`.
+
+		:param kind: The kind to scan
+		:param handler: The function processing the entities; must be decorated with :func:`ShardedScanHandler`
+		:param params: Additional keyword arguments passed to handler; must be json-serializable
+		:param filters: Additional equality filters (eg. {"viur_src_kind =": "page"}) to restrict the scan
+		:param shardCount: How many key-ranges should be processed in parallel
+		:param batchSize: How many entities are passed to handler at once
+		:param name: Human readable name of this scan used for logging and the notification
+		:param notify: Email address to inform after the scan finished
+		:param inline: Process the shards using a thread pool inside this request instead of deferred tasks
+		:returns: The id of this scan
+	"""
+	handlerName = "%s.%s" % (handler.__name__, handler.__module__)
+	if handlerName not in _scanHandlers:
+		raise ValueError("%s must be decorated with @ShardedScanHandler" % handlerName)
+	shardCount = shardCount or conf["viur.tasks.shardedScan.shards"]
+	splitPoints = db.getKeyRangeSplitPoints(kind, shardCount)
+	scanId = utils.generateRandomString(13)
+	scan = db.Entity(db.Key(shardedScanKindName, scanId))
+	scan["kind"] = kind
+	scan["name"] = name or "Scan of %s" % kind
+	scan["handler"] = handlerName
+	scan["params"] = json.dumps(params or {}, cls=JsonKeyEncoder)
+	scan["filters"] = json.dumps(filters or {}, cls=JsonKeyEncoder)
+	scan["batchSize"] = batchSize or conf["viur.tasks.shardedScan.batchSize"]
+	scan["shardCount"] = len(splitPoints) + 1
+	scan["notify"] = notify
+	scan["creationdate"] = utils.utcNow()
+	scan["finished"] = False
+	scan.exclude_from_indexes = {"params", "filters"}
+	shards = []
+	for idx, (lowerBound, upperBound) in enumerate(zip([None] + splitPoints, splitPoints + [None])):
+		shard = db.Entity(db.Key(shardedScanShardKindName, "%s-%s" % (scanId, idx)))
+		shard["scanId"] = scanId
+		shard["lowerBound"] = lowerBound
+		shard["upperBound"] = upperBound
+		shard["cursor"] = None
+		shard["processed"] = 0
+		shard["counters"] = "{}"
+		shard["done"] = False
+		shard["changedate"] = scan["creationdate"]
+		shard.exclude_from_indexes = {"cursor", "counters"}
+		shards.append(shard)
+	db.Put([scan] + shards)
+	logging.info("Starting %s (%s) using %s shards" % (scan["name"], scanId, len(shards)))
+	if inline:
+		_runShardedScanInline(scanId, list(range(len(shards))))
+	else:
+		for idx in range(len(shards)):
+			processShardedScan(scanId, idx)
+	return scanId
+
+
+def resumeShardedScan(scanId: str, inline: bool = False) -> None:
+	"""
+		Continues all unfinished shards of the given scan from their last checkpoint.
+	"""
+	scan = db.Get(db.Key(shardedScanKindName, scanId))
+	if not scan:
+		raise ValueError("Unknown scan %s" % scanId)
+	shards = db.GetMulti([db.Key(shardedScanShardKindName, "%s-%s" % (scanId, x)) for x in range(scan["shardCount"])])
+	pendingShards = [idx for idx, shard in enumerate(shards) if shard and not shard["done"]]
+	logging.info("Resuming %s (%s) with %s pending shards" % (scan["name"], scanId, len(pendingShards)))
+	if inline:
+		_runShardedScanInline(scanId, pendingShards)
+	else:
+		for idx in pendingShards:
+			processShardedScan(scanId, idx)
+
+
+def getShardedScanProgress(scanId: str) -> Union[None, Dict[str, Any]]:
+	"""
+		Returns the progress of the given scan: shards done, entities processed, the summed up counters
+		returned by its handler and the throughput (entities per second) so far.
+	"""
+	scan = db.Get(db.Key(shardedScanKindName, scanId))
+	if not scan:
+		return None
+	shards = db.GetMulti([db.Key(shardedScanShardKindName, "%s-%s" % (scanId, x)) for x in range(scan["shardCount"])])
+	shards = [x for x in shards if x]
+	counters = {}
+	for shard in shards:
+		for k, v in json.loads(shard["counters"]).items():
+			counters[k] = counters.get(k, 0) + v
+	processed = sum([x["processed"] for x in shards])
+	lastChange = max([x["changedate"] for x in shards] + [scan["creationdate"]])
+	duration = max((lastChange - scan["creationdate"]).total_seconds(), 0.001)
+	return {
+		"name": scan["name"],
+		"kind": scan["kind"],
+		"shards": scan["shardCount"],
+		"shardsDone": len([x for x in shards if x["done"]]),
+		"finished": scan["finished"],
+		"processed": processed,
+		"counters": counters,
+		"duration": duration,
+		"throughput": processed / duration,
+	}
+
+
+def _processShardedScanBatch(scanId: str, shardIdx: int) -> bool:
+	"""
+		Processes the next batch of the given shard and checkpoints its cursor.
+
+		:returns: True if there might be more entities left in that shard
+	"""
+	shard = db.Get(db.Key(shardedScanShardKindName, "%s-%s" % (scanId, shardIdx)))
+	if not shard or shard["done"]:
+		return False
+	scan = db.Get(db.Key(shardedScanKindName, scanId))
+	handler = _scanHandlers.get(scan["handler"])
+	if not handler:
+		logging.error("Unknown handler %s for scan %s" % (scan["handler"], scanId))
+		raise PermanentTaskFailure()
+	query = db.Query(scan["kind"])
+	for k, v in json.loads(scan["filters"], object_hook=jsonDecodeObjectHook).items():
+		query.filter(k, v)
+	if shard["lowerBound"]:
+		query.filter("%s >=" % db.KEY_SPECIAL_PROPERTY, shard["lowerBound"])
+	if shard["upperBound"]:
+		query.filter("%s <" % db.KEY_SPECIAL_PROPERTY, shard["upperBound"])
+	startCursor = shard["cursor"]
+	query.setCursor(startCursor)
+	entities = query.run(scan["batchSize"]) or []
+	counters = handler(entities, **json.loads(scan["params"], object_hook=jsonDecodeObjectHook)) or {}
+	cursor = query.getCursor()
+
+	def checkpointTxn(shardKey):
+		shard = db.Get(shardKey)
+		if shard["done"] or shard["cursor"] != startCursor:
+			# Another task (eg. a retry running elsewhere) already moved on; don't move that checkpoint backwards
+			logging.warning("Shard %s has been checkpointed by another task, stopping here" % shardKey.id_or_name)
+			return False
+		shardCounters = json.loads(shard["counters"])
+		for k, v in counters.items():
+			shardCounters[k] = shardCounters.get(k, 0) + v
+		shard["counters"] = json.dumps(shardCounters)
+		shard["processed"] += len(entities)
+		shard["done"] = not cursor or not entities or cursor == startCursor
+		shard["cursor"] = cursor
+		shard["changedate"] = utils.utcNow()
+		db.Put(shard)
+		return not shard["done"]
+
+	return db.RunInTransaction(checkpointTxn, shard.key)
+
+
+@callDeferred
+def processShardedScan(scanId: str, shardIdx: int) -> None:
+	"""
+		Processes batches of one shard of a sharded scan. After conf["viur.tasks.shardedScan.taskDuration"]
+		seconds, processing continues in a new task.
+	"""
+	endTime = time() + conf["viur.tasks.shardedScan.taskDuration"]
+	while _processShardedScanBatch(scanId, shardIdx):
+		if time() > endTime:
+			processShardedScan(scanId, shardIdx)
+			break
+	else:
+		_finishShardedScan(scanId)
+
+
+def _runShardedScanInline(scanId: str, shardIdxs: List[int]) -> None:
+	"""
+		Processes the given shards of a sharded scan concurrently inside this request.
+	"""
+
+	def processShard(shardIdx):
+		while _processShardedScanBatch(scanId, shardIdx):
+			pass
+
+	if shardIdxs:
+		with ThreadPoolExecutor(max_workers=len(shardIdxs), thread_name_prefix="viur-sharded-scan") as executor:
+			# Each shard gets its own copy of our context, so they'll see the current request and session
+			futures = [executor.submit(copy_context().run, processShard, x) for x in shardIdxs]
+			for future in futures:
+				future.result()
+	_finishShardedScan(scanId)
+
+
+def _finishShardedScan(scanId: str) -> None:
+	"""
+		Logs the progress of the given scan and sends the notification once all of its shards are done.
+	"""
+	progress = getShardedScanProgress(scanId)
+	if not progress:
+		return
+	logging.info("%s (%s): %s of %s shards done, %s entities processed (%.1f per second), %s" % (
+		progress["name"], scanId, progress["shardsDone"], progress["shards"], progress["processed"],
+		progress["throughput"], progress["counters"]))
+
+	def markFinished():
+		# Determine the progress again inside this transaction, so all shards are seen in their current state
+		progress = getShardedScanProgress(scanId)
+		if progress["finished"] or progress["shardsDone"] < progress["shards"]:
+			return None, progress
+		scan = db.Get(db.Key(shardedScanKindName, scanId))
+		scan["finished"] = True
+		db.Put(scan)
+		return scan, progress
+
+	scan, progress = db.RunInTransaction(markFinished)
+	if scan and scan["notify"]:  # Only the shard finishing last will send the notification
+		try:
+			txt = ("Subject: %s finished\n\n" +
+				   "ViUR finished %s.\n" +
+				   "%d records processed in %d seconds, %s") % (
+					  progress["name"], progress["name"], progress["processed"], progress["duration"],
+					  progress["counters"])
+			utils.sendEMail([scan["notify"]], txt, None)
+		except:  # OverQuota, whatever
+			pass
+
 ## Tasks ##
 
 